@@ -0,0 +1,259 @@
+# backends.py
+# Взаимозаменяемые движки для запуска модели Custom Vision
+import numpy as np
+import os
+
+
+class InferenceBackend:
+    """
+    Базовый класс движка
+    
+    Движок получает пакет float32 (N, 320, 320, 3) в RGB 0-255 и
+    возвращает (boxes, scores, classes) в том же виде, что и граф
+    TensorFlow; boxes - None, если рамки недоступны.
+    """
+    
+    name = None
+    model_file = None  # имя файла модели в папке model_dir
+    
+    def __init__(self, model_dir):
+        self.model_dir = model_dir
+    
+    @property
+    def model_path(self):
+        return os.path.join(self.model_dir, self.model_file)
+    
+    def _check_model_file(self):
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(f"Файл модели не найден: {self.model_path}")
+    
+    def load(self):
+        """Загрузка модели"""
+        raise NotImplementedError
+    
+    def run(self, batch):
+        """
+        Args:
+            batch: float32 массив (N, 320, 320, 3)
+        
+        Returns:
+            (boxes, scores, classes)
+        """
+        raise NotImplementedError
+    
+    def close(self):
+        """Освобождение ресурсов"""
+
+
+class TFSessionBackend(InferenceBackend):
+    """Замороженный граф saved_model.pb в tf.Session (tensorflow.compat.v1)"""
+    
+    name = 'tf'
+    model_file = 'saved_model.pb'
+    
+    def __init__(self, model_dir):
+        super().__init__(model_dir)
+        self.session = None
+        self.input_tensor = None
+        self.boxes_tensor = None
+        self.scores_tensor = None
+        self.classes_tensor = None
+    
+    def load(self):
+        self._check_model_file()
+        
+        import tensorflow.compat.v1 as tf
+        
+        # Подавляем предупреждения
+        tf.logging.set_verbosity(tf.logging.ERROR)
+        tf.disable_eager_execution()
+        
+        # Загружаем граф модели
+        with tf.gfile.GFile(self.model_path, 'rb') as f:
+            graph_def = tf.GraphDef().FromString(f.read())
+        
+        graph = tf.Graph()
+        with graph.as_default():
+            tf.import_graph_def(graph_def, name='')
+        
+        # Создаем сессию
+        self.session = tf.Session(graph=graph)
+        
+        # Получаем тензоры
+        self.input_tensor = graph.get_tensor_by_name('image_tensor:0')
+        self.scores_tensor = graph.get_tensor_by_name('detected_scores:0')
+        self.classes_tensor = graph.get_tensor_by_name('detected_classes:0')
+        try:
+            self.boxes_tensor = graph.get_tensor_by_name('detected_boxes:0')
+        except KeyError:
+            self.boxes_tensor = None
+    
+    def run(self, batch):
+        if self.boxes_tensor is None:
+            scores, classes = self.session.run(
+                [self.scores_tensor, self.classes_tensor],
+                feed_dict={self.input_tensor: batch}
+            )
+            return None, scores, classes
+        
+        return self.session.run(
+            [self.boxes_tensor, self.scores_tensor, self.classes_tensor],
+            feed_dict={self.input_tensor: batch}
+        )
+    
+    def close(self):
+        if self.session:
+            self.session.close()
+            self.session = None
+
+
+class TFLiteBackend(InferenceBackend):
+    """model.tflite через tflite_runtime (или tf.lite, если он установлен)"""
+    
+    name = 'tflite'
+    model_file = 'model.tflite'
+    
+    def __init__(self, model_dir):
+        super().__init__(model_dir)
+        self.interpreter = None
+        self.input_index = None
+        self.boxes_index = None
+        self.scores_index = None
+        self.classes_index = None
+        self._batch = 1
+    
+    def load(self):
+        self._check_model_file()
+        
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            try:
+                from tensorflow.lite import Interpreter
+            except ImportError:
+                raise ImportError("TFLite не установлен. Установите: pip install tflite-runtime")
+        
+        self.interpreter = Interpreter(model_path=self.model_path)
+        self.interpreter.allocate_tensors()
+        self.input_index = self.interpreter.get_input_details()[0]['index']
+        
+        # Выходы ищем по имени, иначе берем порядок boxes, scores, classes
+        outputs = self.interpreter.get_output_details()
+        by_name = {detail['name']: detail['index'] for detail in outputs}
+        self.scores_index = next((index for name, index in by_name.items() if 'score' in name),
+                                 outputs[1]['index'])
+        self.classes_index = next((index for name, index in by_name.items() if 'class' in name),
+                                  outputs[2]['index'])
+        self.boxes_index = next((index for name, index in by_name.items() if 'box' in name),
+                                outputs[0]['index'])
+    
+    def run(self, batch):
+        if len(batch) != self._batch:
+            self.interpreter.resize_tensor_input(self.input_index, batch.shape)
+            self.interpreter.allocate_tensors()
+            self._batch = len(batch)
+        
+        self.interpreter.set_tensor(self.input_index, batch)
+        self.interpreter.invoke()
+        return (self.interpreter.get_tensor(self.boxes_index),
+                self.interpreter.get_tensor(self.scores_index),
+                self.interpreter.get_tensor(self.classes_index))
+
+
+class OpenCVDNNBackend(InferenceBackend):
+    """Тот же saved_model.pb через cv2.dnn - без TensorFlow"""
+    
+    name = 'opencv'
+    model_file = 'saved_model.pb'
+    
+    def __init__(self, model_dir):
+        super().__init__(model_dir)
+        self.net = None
+        self.output_names = None  # [boxes или None, scores, classes]
+    
+    def load(self):
+        self._check_model_file()
+        
+        import cv2
+        
+        self.net = cv2.dnn.readNetFromTensorflow(self.model_path)
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        
+        # Выходы ищем по имени среди выходов графа; рамок может не быть
+        names = list(self.net.getUnconnectedOutLayersNames())
+        boxes = next((name for name in names if 'box' in name), None)
+        scores = next((name for name in names if 'score' in name), None)
+        classes = next((name for name in names if 'class' in name), None)
+        if scores is None or classes is None:
+            raise ValueError(f"В модели {self.model_path} нет выходов scores/classes, "
+                             f"выходы графа: {', '.join(names) or 'нет'}")
+        self.output_names = [boxes, scores, classes]
+    
+    def run(self, batch):
+        # cv2.dnn принимает NCHW
+        self.net.setInput(np.ascontiguousarray(batch.transpose(0, 3, 1, 2)))
+        if self.output_names[0] is None:
+            scores, classes = self.net.forward(self.output_names[1:])
+            return None, scores, classes
+        
+        boxes, scores, classes = self.net.forward(self.output_names)
+        return boxes, scores, classes
+
+
+class ONNXBackend(InferenceBackend):
+    """model.onnx через ONNX Runtime"""
+    
+    name = 'onnx'
+    model_file = 'model.onnx'
+    
+    def __init__(self, model_dir):
+        super().__init__(model_dir)
+        self.session = None
+        self.input_name = None
+        self.output_names = None
+        self.channels_first = False
+    
+    def load(self):
+        self._check_model_file()
+        
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError("ONNX Runtime не установлен. Установите: pip install onnxruntime")
+        
+        self.session = onnxruntime.InferenceSession(self.model_path,
+                                                    providers=['CPUExecutionProvider'])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Экспорт может ждать NCHW: (N, 3, 320, 320)
+        self.channels_first = len(model_input.shape) == 4 and model_input.shape[1] == 3
+        
+        names = [output.name for output in self.session.get_outputs()]
+        self.output_names = [
+            next((name for name in names if 'box' in name), names[0]),
+            next((name for name in names if 'score' in name), names[1]),
+            next((name for name in names if 'class' in name), names[2]),
+        ]
+    
+    def run(self, batch):
+        if self.channels_first:
+            batch = np.ascontiguousarray(batch.transpose(0, 3, 1, 2))
+        boxes, scores, classes = self.session.run(self.output_names, {self.input_name: batch})
+        return boxes, scores, classes
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (TFSessionBackend, TFLiteBackend, OpenCVDNNBackend, ONNXBackend)
+}
+
+
+def create_backend(name, model_dir):
+    """Создание и загрузка движка по имени из конфигурации"""
+    if name not in BACKENDS:
+        raise ValueError(f"Неизвестный движок '{name}', доступны: {', '.join(BACKENDS)}")
+    
+    backend = BACKENDS[name](model_dir)
+    backend.load()
+    return backend
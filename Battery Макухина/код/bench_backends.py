@@ -0,0 +1,111 @@
+# bench_backends.py
+# Сравнение движков: время загрузки, задержка на кадр и пиковая память (RSS)
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+def peak_rss_mb():
+    """Пиковый RSS текущего процесса, МБ"""
+    try:
+        import resource
+    except ImportError:
+        return float('nan')  # Windows
+    
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдает КБ, macOS - байты
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_single(backend_name, model_dir, images, repeat):
+    """Замер одного движка (запускается в отдельном процессе)"""
+    import numpy as np
+    import cv2
+    
+    from backends import create_backend
+    from preprocess import FramePreprocessor
+    
+    preprocessor = FramePreprocessor(size=(320, 320))
+    frames = [cv2.imread(path) for path in images]
+    frames = [frame for frame in frames if frame is not None]
+    if not frames:
+        raise RuntimeError("Нет тестовых изображений")
+    
+    started = time.perf_counter()
+    backend = create_backend(backend_name, model_dir)
+    load_time = time.perf_counter() - started
+    
+    # Первый запуск отдельно - он включает ленивую инициализацию
+    started = time.perf_counter()
+    backend.run(preprocessor.prepare_batch(frames[:1]))
+    first_run = time.perf_counter() - started
+    
+    timings = []
+    for _ in range(repeat):
+        for frame in frames:
+            batch = preprocessor.prepare_batch([frame])
+            started = time.perf_counter()
+            backend.run(batch)
+            timings.append(time.perf_counter() - started)
+    backend.close()
+    
+    timings_ms = np.array(timings) * 1000
+    return {
+        'backend': backend_name,
+        'load_s': load_time,
+        'first_ms': first_run * 1000,
+        'mean_ms': float(timings_ms.mean()),
+        'p95_ms': float(np.percentile(timings_ms, 95)),
+        'rss_mb': peak_rss_mb(),
+    }
+
+
+def main():
+    from backends import BACKENDS
+    
+    parser = argparse.ArgumentParser(description="Бенчмарк движков детектора")
+    parser.add_argument('backends', nargs='*', default=list(BACKENDS),
+                        help=f"движки для сравнения ({', '.join(BACKENDS)})")
+    parser.add_argument('--model-dir', default='tensorflow', help="папка с моделью")
+    parser.add_argument('--images', default=os.path.join('tensorflow', '*.jpg'),
+                        help="маска тестовых изображений")
+    parser.add_argument('--repeat', type=int, default=10, help="повторов набора изображений")
+    parser.add_argument('--single', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    images = sorted(glob.glob(args.images))
+    
+    if args.single:
+        # Дочерний процесс: один движок, результат - JSON в stdout
+        print(json.dumps(run_single(args.backends[0], args.model_dir, images, args.repeat)))
+        return
+    
+    print("=" * 70)
+    print(f"Изображений: {len(images)} x {args.repeat}")
+    print("=" * 70)
+    print(f"{'движок':<8} {'загрузка':>10} {'1-й кадр':>10} {'среднее':>10} {'p95':>10} {'пик RSS':>10}")
+    
+    for name in args.backends:
+        # Каждый движок в своем процессе, чтобы пиковая память не смешивалась
+        result = subprocess.run(
+            [sys.executable, __file__, name, '--single', '--model-dir', args.model_dir,
+             '--images', args.images, '--repeat', str(args.repeat)],
+            capture_output=True, text=True
+        )
+        lines = result.stdout.strip().splitlines()
+        if result.returncode != 0 or not lines:
+            error = (result.stderr.strip().splitlines() or ["неизвестная ошибка"])[-1]
+            print(f"{name:<8} ✗ {error}")
+            continue
+        
+        stats = json.loads(lines[-1])
+        print(f"{name:<8} {stats['load_s']:>9.2f}с {stats['first_ms']:>8.1f}мс "
+              f"{stats['mean_ms']:>8.1f}мс {stats['p95_ms']:>8.1f}мс {stats['rss_mb']:>8.0f}МБ")
+
+
+if __name__ == "__main__":
+    main()
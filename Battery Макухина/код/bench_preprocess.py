@@ -0,0 +1,95 @@
+# bench_preprocess.py
+# Сравнение старой предобработки (cvtColor + PIL) с FramePreprocessor
+import argparse
+import gc
+import os
+import time
+import tracemalloc
+
+import numpy as np
+import cv2
+from PIL import Image
+
+from preprocess import FramePreprocessor
+
+
+def prepare_pil(frame):
+    """Старый путь из detect_frame: cvtColor -> PIL resize -> np.array -> expand_dims"""
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    img = Image.fromarray(rgb).resize((320, 320))
+    img_array = np.array(img, dtype=np.float32)
+    return np.expand_dims(img_array, axis=0)
+
+
+def load_frames(image_path, count):
+    """Тестовые кадры 640x480: из файла или синтетические"""
+    if image_path and os.path.exists(image_path):
+        frame = cv2.resize(cv2.imread(image_path), (640, 480))
+        return [frame.copy() for _ in range(count)]
+    
+    print("Тестовое изображение не найдено, используем случайные кадры")
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, (480, 640, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def measure(name, func, frames, repeat):
+    """Время на кадр и объем выделенной памяти"""
+    # Прогрев
+    for frame in frames:
+        func(frame)
+    
+    gc.collect()
+    collections_before = sum(stat['collections'] for stat in gc.get_stats())
+    
+    timings = []
+    for _ in range(repeat):
+        for frame in frames:
+            start = time.perf_counter()
+            func(frame)
+            timings.append(time.perf_counter() - start)
+    
+    collections = sum(stat['collections'] for stat in gc.get_stats()) - collections_before
+    
+    # Память считаем отдельным проходом, чтобы tracemalloc не искажал время
+    tracemalloc.start()
+    for frame in frames:
+        func(frame)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    timings_ms = np.array(timings) * 1000
+    print(f"{name:<22} среднее {timings_ms.mean():7.3f} мс | "
+          f"медиана {np.median(timings_ms):7.3f} мс | "
+          f"p95 {np.percentile(timings_ms, 95):7.3f} мс | "
+          f"пик памяти {peak / 1024:8.1f} КБ | сборок GC {collections}")
+    return timings_ms.mean()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарк предобработки кадров")
+    parser.add_argument('--image', default=os.path.join('tensorflow', 'test_image.jpg'),
+                        help="тестовое изображение")
+    parser.add_argument('--frames', type=int, default=20, help="кадров в наборе")
+    parser.add_argument('--repeat', type=int, default=25, help="повторов набора")
+    args = parser.parse_args()
+    
+    frames = load_frames(args.image, args.frames)
+    preprocessor = FramePreprocessor(size=(320, 320))
+    
+    print("=" * 50)
+    print(f"Кадров: {len(frames)} x {args.repeat}, размер {frames[0].shape[1]}x{frames[0].shape[0]}")
+    print("=" * 50)
+    
+    old = measure("PIL (старый путь)", prepare_pil, frames, args.repeat)
+    new = measure("FramePreprocessor", lambda f: preprocessor.prepare_batch([f]), frames, args.repeat)
+    
+    print("-" * 50)
+    print(f"Ускорение: x{old / new:.2f}")
+    
+    # Расхождение с эталонной предобработкой (разные фильтры ресайза)
+    diff = np.abs(prepare_pil(frames[0]) - preprocessor.prepare_batch([frames[0]]))
+    print(f"Отличие от PIL: среднее {diff.mean():.2f}, максимум {diff.max():.0f} (из 255)")
+
+
+if __name__ == "__main__":
+    main()
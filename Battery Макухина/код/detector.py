@@ -1,37 +1,167 @@
 # detector.py
-import tensorflow.compat.v1 as tf
-import numpy as np
-from PIL import Image
-import cv2
+import importlib
+import importlib.util
 import time
 import os
+import sys
+import json
+import queue
+import threading
+
+
+class LazyModule:
+    """Модуль, который импортируется при первом обращении к его атрибутам"""
+    
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+    
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+# Тяжелые модули грузятся только когда действительно нужен детектор
+np = LazyModule('numpy')
+cv2 = LazyModule('cv2')
+
+# Настройки по умолчанию (переопределяются файлом detector.json)
+DEFAULT_CONFIG = {
+    'model_dir': 'tensorflow',
+    'backend': 'tf',  # tf, tflite, opencv, onnx
+    'daemon_port': 8765,  # порт демона detector_daemon.py на 127.0.0.1
+    'threshold': 0.5,  # порог уверенности
+    'class_thresholds': {},  # пороги для отдельных меток, например {"crone": 0.7}
+    'top_k': None,  # максимум объектов на кадр
+    'nms_iou': None,  # порог IoU для NMS (если модель отдает рамки)
+    'event_labels': ['aa', 'crone'],  # метки, для которых формируются события
+    'event_hold_time': 1.5,  # сколько секунд объект может пропадать, не завершая событие
+    'event_on_threshold': None,  # уверенность для начала события (null - порог детектора)
+    'event_min_frames': 2,  # проверок подряд до начала события (задержка (N - 1) * интервал проверки)
+    'event_log': 'events.jsonl',  # журнал событий (null - без журнала)
+    'metrics_port': None,  # порт HTTP-эндпоинта /metrics на 127.0.0.1 (null - выключен)
+    'metrics_csv': None,  # CSV со сводкой метрик, с ротацией (null - выключен)
+    'rois': None,  # области интереса [[x1, y1, x2, y2], ...] в долях кадра (null - весь кадр)
+    'tiles': None,  # нарезка областей на плитки [столбцов, строк] (null - без нарезки)
+    'tile_overlap': 0.2,  # перекрытие соседних плиток
+}
+
+
+def load_config(path='detector.json'):
+    """Загрузка настроек детектора из JSON (отсутствующие ключи - по умолчанию)"""
+    config = dict(DEFAULT_CONFIG)
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            config.update(json.load(f))
+    return config
+
+
+class DropOldestQueue(queue.Queue):
+    """Ограниченная очередь: при переполнении выбрасывается самый старый элемент"""
+    
+    def __init__(self, maxsize=1, on_drop=None):
+        super().__init__(maxsize)
+        self.dropped = 0  # сколько элементов выброшено
+        self.on_drop = on_drop  # вызывается для выброшенного элемента
+    
+    def put_latest(self, item):
+        """Положить элемент, освобождая место от самых старых"""
+        while True:
+            try:
+                self.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    old = self.get_nowait()
+                    self.dropped += 1
+                    if self.on_drop:
+                        self.on_drop(old)
+                except queue.Empty:
+                    pass
+
 
 class BatteryDetector:
     """Детектор батареек и компонентов для камеры №1"""
     
-    def __init__(self, model_dir='tensorflow'):
+    def __init__(self, model_dir='tensorflow', camera_id=1, backend='tf',
+                 threshold=0.5, class_thresholds=None, top_k=None, nms_iou=None,
+                 event_labels=('aa', 'crone'), event_hold_time=1.5, event_log=None,
+                 event_on_threshold=None, event_min_frames=2, metrics_port=None, metrics_csv=None, rois=None, tiles=None, tile_overlap=0.2):
         """
         Инициализация детектора
         
         Args:
             model_dir: папка с моделью TensorFlow
+            camera_id: номер камеры для мониторинга (по умолчанию №1)
+            backend: движок запуска модели (см. backends.BACKENDS)
+            threshold: порог уверенности (по умолчанию 50%)
+            class_thresholds: пороги для отдельных меток
+            top_k: максимум объектов на кадр
+            nms_iou: порог IoU для NMS по рамкам (None - без NMS)
+            event_labels: метки, для которых формируются события
+            event_hold_time: допустимый пропуск объекта внутри события, сек
+            event_log: JSONL-журнал событий (None - без журнала)
+            event_on_threshold: уверенность для начала события (None - самый низкий
+                из порогов детектора, чтобы каждое найденное попадало в события)
+            event_min_frames: сколько проверок подряд нужно для начала события
+            metrics_port: порт HTTP-эндпоинта с метриками (None - выключен)
+            metrics_csv: CSV для периодической записи метрик (None - выключен)
+            rois: области интереса [x1, y1, x2, y2] в долях кадра (None - весь кадр)
+            tiles: (столбцов, строк) - нарезка областей на перекрывающиеся плитки
+            tile_overlap: перекрытие соседних плиток (доля размера плитки)
         """
+        from preprocess import FramePreprocessor, ChangeGate
+        from postprocess import PostProcessor
+        from events import EventTracker, print_event
+        from metrics import Metrics
+        
         self.model_dir = model_dir
-        self.camera_id = 1  # Камера №1
+        self.camera_id = camera_id
+        self.backend_name = backend
         self.labels = self._load_labels()
-        self.session = None
-        self.input_tensor = None
-        self.scores_tensor = None
-        self.classes_tensor = None
+        self.backend = None
+        self.batch_supported = True  # поддерживает ли граф batch > 1
+        self.preprocessor = FramePreprocessor(size=(320, 320))
+        self.gate = ChangeGate()  # пропуск статичных кадров
+        self.postprocessor = PostProcessor(self.labels, threshold, class_thresholds, top_k, nms_iou)
+        self.last_detected = self.postprocessor.empty()  # результат последнего запуска модели
+        
+        # Области кадра для модели (ROI и плитки), пересчитываются при смене размера кадра
+        self.rois = rois
+        self.tiles = tiles
+        self.tile_overlap = tile_overlap
+        self._regions = {}
+        
+        # События "объект появился / ушел" вместо сообщения на каждую проверку
+        if event_on_threshold is None:
+            event_on_threshold = min([threshold, *(class_thresholds or {}).values()])
+        self.events = EventTracker(event_labels, on_threshold=event_on_threshold,
+                                   min_frames=event_min_frames, hold_time=event_hold_time,
+                                   log_path=event_log)
+        self.events.subscribe(print_event)
+        
+        # Задержки стадий, FPS и счетчики (см. metrics.snapshot())
+        self.metrics = Metrics()
+        if metrics_port:
+            self.metrics.serve(metrics_port)
+        if metrics_csv:
+            self.metrics.export_csv(metrics_csv)
         
-        self._setup_tensorflow()
         self._load_model()
     
-    def _setup_tensorflow(self):
-        """Настройка TensorFlow"""
-        # Подавляем предупреждения
-        tf.compat.v1.logging.set_verbosity(tf.compat.v1.logging.ERROR)
-        tf.disable_eager_execution()
+    @classmethod
+    def from_config(cls, config, **overrides):
+        """Создание детектора по настройкам из load_config()"""
+        options = {
+            key: config[key]
+            for key in ('model_dir', 'backend', 'threshold', 'class_thresholds', 'top_k', 'nms_iou',
+                        'event_labels', 'event_hold_time', 'event_log', 'event_on_threshold',
+                        'event_min_frames', 'metrics_port', 'metrics_csv',
+                        'rois', 'tiles', 'tile_overlap')
+        }
+        options.update(overrides)
+        return cls(**options)
     
     def _load_labels(self):
         """Загрузка меток классов"""
@@ -46,173 +176,327 @@ class BatteryDetector:
             return ["aa", "crone", "not battary"]
     
     def _load_model(self):
-        """Загрузка модели TensorFlow"""
+        """Загрузка модели выбранным движком"""
         try:
-            model_path = os.path.join(self.model_dir, 'saved_model.pb')
-            
-            if not os.path.exists(model_path):
-                raise FileNotFoundError(f"Файл модели не найден: {model_path}")
-            
-            print("Загрузка модели...")
-            
-            # Загружаем граф модели
-            with tf.gfile.GFile(model_path, 'rb') as f:
-                graph_def = tf.GraphDef().FromString(f.read())
-            
-            graph = tf.Graph()
-            with graph.as_default():
-                tf.import_graph_def(graph_def, name='')
-            
-            # Создаем сессию
-            self.session = tf.Session(graph=graph)
-            
-            # Получаем тензоры
-            self.input_tensor = graph.get_tensor_by_name('image_tensor:0')
-            self.scores_tensor = graph.get_tensor_by_name('detected_scores:0')
-            self.classes_tensor = graph.get_tensor_by_name('detected_classes:0')
+            from backends import create_backend
             
+            print(f"Загрузка модели (движок: {self.backend_name})...")
+            self.backend = create_backend(self.backend_name, self.model_dir)
             print("✓ Модель загружена")
-            
+        
         except Exception as e:
             print(f"✗ Ошибка загрузки модели: {e}")
             raise
     
+    def _run_model(self, img_batch):
+        """Один запуск модели для пакета (N, 320, 320, 3)"""
+        with self.metrics.time('inference'):
+            return self.backend.run(img_batch)
+    
     def detect_frame(self, frame):
         """
         Детекция объектов на кадре
         
         Args:
             frame: numpy array изображения (BGR от OpenCV)
-            
+        
         Returns:
-            Список обнаруженных объектов с confidence > 50%
+            Структурированный массив объектов (см. postprocess.DETECTION_DTYPE)
+            с уверенностью выше порога, по убыванию уверенности
         """
         try:
-            # Конвертируем BGR в RGB
-            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-            # Создаем PIL изображение и ресайзим
-            img = Image.fromarray(rgb).resize((320, 320))
-            
-            # Подготавливаем для модели (0-255, без нормализации!)
-            img_array = np.array(img, dtype=np.float32)
-            img_array = np.expand_dims(img_array, axis=0)
-            
-            # Запускаем детекцию
-            scores, classes = self.session.run(
-                [self.scores_tensor, self.classes_tensor],
-                feed_dict={self.input_tensor: img_array}
-            )
-            
-            # Обработка результатов
-            if not hasattr(scores, '__len__') or scores.shape == ():
-                scores = np.array([scores])
-                classes = np.array([classes])
-            
-            detected = []
-            
-            for i in range(len(scores)):
-                confidence = float(scores[i])
-                if confidence > 0.5:  # порог 50%
-                    class_id = int(classes[i]) if i < len(classes) else 0
-                    label = self.labels[class_id] if class_id < len(self.labels) else f'obj_{class_id}'
-                    
-                    detected.append({
-                        'label': label,
-                        'confidence': confidence,
-                        'class_id': class_id
-                    })
-            
-            return detected
+            if self.rois or self.tiles:
+                return self._detect_regions([frame])[0]
             
+            with self.metrics.time('preprocess'):
+                inputs = self.preprocessor.prepare_batch([frame])
+            return self._detect_prepared(inputs)[0]
         except Exception as e:
             print(f"Ошибка детекции: {e}")
+            return self.postprocessor.empty()
+    
+    def detect_batch(self, frames):
+        """
+        Детекция объектов сразу на нескольких кадрах за один запуск модели
+        
+        Args:
+            frames: список numpy array изображений (BGR от OpenCV)
+        
+        Returns:
+            Список результатов - по одному массиву объектов на каждый кадр
+        """
+        if not frames:
             return []
+        
+        if self.rois or self.tiles:
+            return self._detect_regions(frames)
+        
+        with self.metrics.time('preprocess'):
+            inputs = self.preprocessor.prepare_batch(frames)
+        return self._detect_prepared(inputs)
     
-    def monitor_camera(self, show_preview=False):
+    def _frame_regions(self, frame):
+        """Области кадра (пиксели) для текущих настроек rois/tiles"""
+        from preprocess import frame_regions
+        
+        height, width = frame.shape[:2]
+        if (width, height) not in self._regions:
+            self._regions[(width, height)] = frame_regions(
+                width, height, self.rois, self.tiles, self.tile_overlap
+            )
+        return self._regions[(width, height)]
+    
+    def _detect_regions(self, frames):
         """
-        Мониторинг камеры №1
+        Детекция по областям интереса и плиткам
+        
+        Вырезанные области всех кадров идут в модель одним пакетом, каждая в
+        полном разрешении входа 320x320, поэтому мелкие объекты теряют меньше
+        пикселей. Рамки переводятся обратно в координаты кадра.
         
         Args:
-            show_preview: показывать ли окно с превью
+            frames: список numpy array изображений (BGR от OpenCV)
+        
+        Returns:
+            Список результатов - по одному массиву объектов на каждый кадр
         """
+        from postprocess import merge_regions
+        
+        crops, spans = [], []
+        for frame in frames:
+            regions = self._frame_regions(frame)
+            spans.append((len(crops), regions))
+            crops.extend(frame[y1:y2, x1:x2] for x1, y1, x2, y2 in regions)
+        
+        if not crops:
+            return [self.postprocessor.empty() for _ in frames]
+        
+        with self.metrics.time('preprocess'):
+            inputs = self.preprocessor.prepare_batch(crops)
+        results = self._detect_prepared(inputs)
+        
+        merged = []
+        with self.metrics.time('merge'):
+            for frame, (start, regions) in zip(frames, spans):
+                height, width = frame.shape[:2]
+                detected = merge_regions(results[start:start + len(regions)], regions,
+                                         width, height, self.postprocessor.nms_iou or 0.5)
+                if self.postprocessor.top_k:
+                    detected = detected[:self.postprocessor.top_k]
+                merged.append(detected)
+        return merged
+    
+    def detect_changed(self, frame):
+        """
+        Детекция только при изменении сцены (см. ChangeGate)
+        
+        Args:
+            frame: numpy array изображения (BGR от OpenCV)
+        
+        Returns:
+            (список объектов, был ли запущен детектор) - для статичной сцены
+            возвращается результат последнего запуска
+        """
+        if not self.gate.changed(frame):
+            self.metrics.count('skipped_static')
+            return self.last_detected, False
+        
+        self.last_detected = self.detect_frame(frame)
+        return self.last_detected, True
+    
+    def _detect_prepared(self, inputs):
+        """
+        Детекция на уже подготовленных входах (см. FramePreprocessor)
+        
+        Args:
+            inputs: float32 массив (N, 320, 320, 3) или список массивов 320x320x3
+        
+        Returns:
+            Список результатов - по одному массиву объектов на каждый вход
+        """
+        if len(inputs) == 1 or not self.batch_supported:
+            results = []
+            for img_array in inputs:
+                try:
+                    boxes, scores, classes = self._run_model(np.expand_dims(img_array, axis=0))
+                    with self.metrics.time('postprocess'):
+                        results.append(self.postprocessor(scores, classes, boxes))
+                except Exception as e:
+                    print(f"Ошибка детекции: {e}")
+                    results.append(self.postprocessor.empty())
+            self.metrics.tick('inferred', len(results))
+            return results
+        
+        try:
+            batch = inputs if isinstance(inputs, np.ndarray) else np.stack(inputs)
+            boxes, scores, classes = self._run_model(batch)
+        except Exception as e:
+            # Граф экспортирован с фиксированным batch=1
+            print(f"Пакетный режим не поддерживается моделью ({e})")
+            print("Переключаюсь на покадровую детекцию")
+            self.batch_supported = False
+            return self._detect_prepared(inputs)
+        
+        scores = np.asarray(scores)
+        classes = np.asarray(classes)
+        
+        # Выходы должны быть разбиты по кадрам: (N, кол-во детекций)
+        if scores.ndim < 2 or scores.shape[0] != len(inputs):
+            print("Модель не разделяет выходы по кадрам, переключаюсь на покадровую детекцию")
+            self.batch_supported = False
+            return self._detect_prepared(inputs)
+        
+        with self.metrics.time('postprocess'):
+            results = [
+                self.postprocessor(scores[i], classes[i], boxes[i] if boxes is not None else None)
+                for i in range(len(inputs))
+            ]
+        self.metrics.tick('inferred', len(results))
+        return results
+    
+    def _report_detections(self, detected, source=None, timestamp=None):
+        """
+        Передача результата проверки трекеру событий
+        
+        В консоль (и журнал) попадает одна строка на появление объекта и
+        одна на его уход, а не сообщение на каждую проверку.
+        
+        Args:
+            detected: список объектов от detect_frame
+            source: имя источника (для нескольких камер)
+            timestamp: время захвата кадра
+        """
+        self.events.update(detected, source, timestamp)
+    
+    def _print_header(self, show_preview, mode=None):
+        """Заголовок режима мониторинга"""
         print("=" * 50)
         print("ДЕТЕКТОР БАТАРЕЕК И КОМПОНЕНТОВ")
         print("=" * 50)
         print(f"Камера: #{self.camera_id}")
         print("Поиск: 'aa' (батарейка) и 'crone' (компонент)")
         print(f"Превью: {'ВКЛ' if show_preview else 'ВЫКЛ'}")
+        if self.rois or self.tiles:
+            print(f"Областей интереса: {len(self.rois or [None])}, "
+                  f"плитки: {'x'.join(map(str, self.tiles)) if self.tiles else 'нет'}")
+        if mode:
+            print(mode)
         print("Нажмите Ctrl+C для остановки")
         print("=" * 50)
-        
-        # Открываем камеру
+    
+    def open_camera(self):
+        """Открытие и настройка камеры, None при ошибке"""
         cap = cv2.VideoCapture(self.camera_id)
         if not cap.isOpened():
             print(f"✗ Ошибка: не удалось открыть камеру {self.camera_id}")
             print("Проверьте подключение камеры")
-            return
+            return None
         
         # Настраиваем камеру
         cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
         cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+        return cap
+    
+    def _show_preview(self, frame, status_text="STATUS: MONITORING"):
+        """
+        Показ кадра в окне превью
+        
+        Returns:
+            True, если пользователь нажал 'q'
+        """
+        # Добавляем текст на превью
+        display = frame.copy()
+        cv2.putText(display, f"Camera {self.camera_id} - Battery Detector", 
+                   (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        
+        # Статус
+        status_y = display.shape[0] - 20
+        cv2.putText(display, status_text, (10, status_y),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+        
+        cv2.imshow('Battery Detector', display)
+        
+        # Выход по 'q' из окна превью
+        return cv2.waitKey(1) & 0xFF == ord('q')
+    
+    def monitor_camera(self, show_preview=False, batch_size=1, batch_timeout=0.5,
+                       check_interval=1.0, motion_gating=False):
+        """
+        Мониторинг камеры №1
+        
+        Args:
+            show_preview: показывать ли окно с превью
+            batch_size: сколько кадров отправлять в модель за один вызов
+                        (1 - обычная проверка раз в check_interval)
+            batch_timeout: максимальное ожидание набора пакета, сек
+            check_interval: интервал между проверками, сек
+            motion_gating: не запускать модель, пока сцена не меняется
+        """
+        mode = None
+        if batch_size > 1:
+            mode = f"Пакетный режим: {batch_size} кадров / {batch_timeout * 1000:.0f} мс"
+        if motion_gating:
+            mode = (mode + "\n" if mode else "") + "Пропуск статичных кадров: ВКЛ"
+        self._print_header(show_preview, mode)
+        
+        # Открываем камеру
+        cap = self.open_camera()
+        if cap is None:
+            return
         
         last_check = 0
-        check_interval = 1.0  # проверка каждую секунду
+        self.gate.reset()
+        
+        pending = []  # кадры, ожидающие пакетной детекции
+        pending_times = []  # время захвата этих кадров
+        batch_started = 0
         
         try:
             while True:
                 # Читаем кадр
-                ret, frame = cap.read()
+                with self.metrics.time('capture'):
+                    ret, frame = cap.read()
                 if not ret:
+                    self.metrics.count('read_errors')
                     print("Ошибка чтения кадра")
                     time.sleep(0.1)
                     continue
                 
                 current_time = time.time()
+                self.metrics.tick('captured')
+                
+                if batch_size > 1:
+                    # Пакетный режим: копим кадры и отправляем их в модель одним вызовом
+                    # (статичные кадры в пакет не попадают)
+                    if not motion_gating or self.gate.changed(frame):
+                        if not pending:
+                            batch_started = current_time
+                        pending.append(frame)
+                        pending_times.append(current_time)
+                    else:
+                        self.metrics.count('skipped_static')
+                    
+                    if pending and (len(pending) >= batch_size or
+                                    current_time - batch_started >= batch_timeout):
+                        for detected, captured in zip(self.detect_batch(pending), pending_times):
+                            self._report_detections(detected, timestamp=captured)
+                        pending = []
+                        pending_times = []
                 
                 # Проверяем по времени
-                if current_time - last_check > check_interval:
+                elif current_time - last_check > check_interval:
                     # Детекция
-                    detected = self.detect_frame(frame)
+                    if motion_gating:
+                        detected, _ = self.detect_changed(frame)
+                    else:
+                        detected = self.detect_frame(frame)
                     last_check = current_time
-                    
-                    # Проверяем на aa и crone
-                    for obj in detected:
-                        label = obj['label']
-                        confidence = obj['confidence']
-                        
-                        if label == 'aa':
-                            print(f"[{time.strftime('%H:%M:%S')}] ⚠️ ОБНАРУЖЕНА БАТАРЕЙКА 'aa'! ({confidence:.1%})")
-                        
-                        if label == 'crone':
-                            print(f"[{time.strftime('%H:%M:%S')}] ⚠️ ОБНАРУЖЕН КОМПОНЕНТ 'crone'! ({confidence:.1%})")
-                    
-                    # Выводим все обнаруженные объекты
-                    if detected:
-                        print(f"Всего объектов: {len(detected)}")
-                        for obj in detected:
-                            print(f"  - {obj['label']}: {obj['confidence']:.1%}")
-                        print("-" * 40)
+                    self._report_detections(detected, timestamp=current_time)
                 
                 # Показываем превью если нужно
-                if show_preview:
-                    # Добавляем текст на превью
-                    display = frame.copy()
-                    cv2.putText(display, f"Camera {self.camera_id} - Battery Detector", 
-                               (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                    
-                    # Статус
-                    status_y = display.shape[0] - 20
-                    status_text = "STATUS: MONITORING"
-                    cv2.putText(display, status_text, (10, status_y),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-                    
-                    cv2.imshow('Battery Detector', display)
-                    
-                    # Выход по 'q' из окна превью
-                    if cv2.waitKey(1) & 0xFF == ord('q'):
-                        print("\nВыход по запросу (кнопка 'q' в окне)")
-                        break
+                if show_preview and self._show_preview(frame):
+                    print("\nВыход по запросу (кнопка 'q' в окне)")
+                    break
         
         except KeyboardInterrupt:
             print("\n\nОстановка по запросу пользователя (Ctrl+C)")
@@ -220,9 +504,142 @@ class BatteryDetector:
             print(f"\nОшибка: {e}")
         finally:
             # Очистка
+            self.events.flush()
             cap.release()
             if show_preview:
                 cv2.destroyAllWindows()
+            if motion_gating:
+                print(f"Пропущено статичных кадров: {self.gate.skipped} из {self.gate.checked} "
+                      f"({self.gate.skip_ratio:.0%})")
+            self.metrics.print_report()
+            print("Камера закрыта")
+    
+    def monitor_pipeline(self, show_preview=False, batch_size=1, queue_size=2):
+        """
+        Конвейерный мониторинг камеры №1
+        
+        Захват, предобработка и детекция работают в отдельных потоках и
+        связаны ограниченными очередями: при переполнении выбрасывается самый
+        старый кадр. Камера не ждет модель, а скорость ограничена самой
+        медленной стадией, а не суммой всех.
+        
+        Args:
+            show_preview: показывать ли окно с превью
+            batch_size: максимум подготовленных кадров на один вызов модели
+            queue_size: размер очереди между предобработкой и детекцией
+        
+        Области интереса и плитки (rois/tiles) в этом режиме не применяются:
+        предобработка готовит по одному входу модели на кадр.
+        """
+        self._print_header(show_preview, "Конвейерный режим: захват → предобработка → детекция")
+        
+        cap = self.open_camera()
+        if cap is None:
+            return
+        
+        stop = threading.Event()
+        
+        # Пул входных буферов: предобработка пишет в свободный буфер, детекция
+        # и выброс из очереди возвращают его обратно - без выделений на кадр
+        buffers = queue.Queue()
+        for _ in range(queue_size + batch_size + 1):
+            buffers.put(self.preprocessor.new_buffer())
+        
+        def drop_frame(frame):
+            self.metrics.count('dropped_capture')
+        
+        def drop_input(buffer):
+            self.metrics.count('dropped_preprocess')
+            buffers.put(buffer)
+        
+        frames_queue = DropOldestQueue(1, on_drop=drop_frame)  # захват -> предобработка
+        inputs_queue = DropOldestQueue(queue_size, on_drop=drop_input)  # предобработка -> детекция
+        latest = {'frame': None, 'status': "STATUS: MONITORING"}
+        
+        def capture_stage():
+            # Держим только самый свежий кадр
+            while not stop.is_set():
+                with self.metrics.time('capture'):
+                    ret, frame = cap.read()
+                if not ret:
+                    self.metrics.count('read_errors')
+                    print("Ошибка чтения кадра")
+                    time.sleep(0.1)
+                    continue
+                self.metrics.tick('captured')
+                latest['frame'] = frame
+                frames_queue.put_latest(frame)
+        
+        def preprocess_stage():
+            while not stop.is_set():
+                try:
+                    frame = frames_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                buffer = buffers.get()
+                try:
+                    with self.metrics.time('preprocess'):
+                        prepared = self.preprocessor.prepare(frame, out=buffer)
+                    inputs_queue.put_latest(prepared)
+                except Exception as e:
+                    print(f"Ошибка предобработки: {e}")
+                    buffers.put(buffer)
+        
+        def inference_stage():
+            while not stop.is_set():
+                try:
+                    batch = [inputs_queue.get(timeout=0.1)]
+                except queue.Empty:
+                    continue
+                # Забираем все, что уже готово, но не ждем добора пакета
+                while len(batch) < batch_size:
+                    try:
+                        batch.append(inputs_queue.get_nowait())
+                    except queue.Empty:
+                        break
+                results = self._detect_prepared(batch)
+                for buffer in batch:
+                    buffers.put(buffer)
+                
+                for detected in results:
+                    self._report_detections(detected)
+                    labels = ", ".join(obj['label'] for obj in detected)
+                    latest['status'] = f"DETECTED: {labels}" if labels else "STATUS: MONITORING"
+        
+        workers = [
+            threading.Thread(target=stage, daemon=True)
+            for stage in (capture_stage, preprocess_stage, inference_stage)
+        ]
+        for worker in workers:
+            worker.start()
+        
+        shown = None  # последний показанный кадр
+        
+        try:
+            while True:
+                # Окна OpenCV должны обновляться из главного потока
+                frame = latest['frame']
+                if show_preview and frame is not None and frame is not shown:
+                    shown = frame
+                    if self._show_preview(frame, latest['status']):
+                        print("\nВыход по запросу (кнопка 'q' в окне)")
+                        break
+                else:
+                    time.sleep(0.005 if show_preview else 0.1)
+        
+        except KeyboardInterrupt:
+            print("\n\nОстановка по запросу пользователя (Ctrl+C)")
+        finally:
+            stop.set()
+            for worker in workers:
+                worker.join(timeout=2)
+            self.events.flush()
+            cap.release()
+            if show_preview:
+                cv2.destroyAllWindows()
+            print(f"Отброшено кадров: захват {frames_queue.dropped}, "
+                  f"предобработка {inputs_queue.dropped}")
+            self.metrics.print_report()
             print("Камера закрыта")
     
     def single_check(self):
@@ -244,63 +661,110 @@ class BatteryDetector:
             # Детекция
             detected = self.detect_frame(frame)
             
-            print("\n" + "="*40)
-            print("РЕЗУЛЬТАТЫ ПРОВЕРКИ:")
-            print("="*40)
-            
-            if detected:
-                aa_found = False
-                crone_found = False
-                
-                for obj in detected:
-                    label = obj['label']
-                    confidence = obj['confidence']
-                    
-                    print(f"- {label}: {confidence:.1%}")
-                    
-                    if label == 'aa':
-                        aa_found = True
-                        print("  ⚠️ ВНИМАНИЕ: Обнаружена батарейка!")
-                    
-                    if label == 'crone':
-                        crone_found = True
-                        print("  ⚠️ ВНИМАНИЕ: Обнаружен компонент!")
-                
-                if aa_found and crone_found:
-                    print("\n🔴 КРИТИЧЕСКОЕ ОБНАРУЖЕНИЕ: найдены и батарейка и компонент!")
-                elif aa_found:
-                    print("\n🟡 ОБНАРУЖЕНО: батарейка 'aa'")
-                elif crone_found:
-                    print("\n🟡 ОБНАРУЖЕНО: компонент 'crone'")
-                    
-            else:
-                print("Объекты не обнаружены")
-                print("🟢 Безопасно")
-            
+            print_check_results(detected)
+        
         finally:
             cap.release()
     
     def close(self):
         """Закрытие ресурсов"""
-        if self.session:
-            self.session.close()
-            print("Ресурсы TensorFlow освобождены")
+        self.events.close()
+        self.metrics.close()
+        if self.backend:
+            self.backend.close()
+            self.backend = None
+            print("Ресурсы модели освобождены")
+
+
+def print_check_results(detected):
+    """Вывод результатов однократной проверки"""
+    print("\n" + "="*40)
+    print("РЕЗУЛЬТАТЫ ПРОВЕРКИ:")
+    print("="*40)
+    
+    if len(detected):
+        aa_found = False
+        crone_found = False
+        
+        for obj in detected:
+            label = obj['label']
+            confidence = obj['confidence']
+            
+            print(f"- {label}: {confidence:.1%}")
+            
+            if label == 'aa':
+                aa_found = True
+                print("  ⚠️ ВНИМАНИЕ: Обнаружена батарейка!")
+            
+            if label == 'crone':
+                crone_found = True
+                print("  ⚠️ ВНИМАНИЕ: Обнаружен компонент!")
+        
+        if aa_found and crone_found:
+            print("\n🔴 КРИТИЧЕСКОЕ ОБНАРУЖЕНИЕ: найдены и батарейка и компонент!")
+        elif aa_found:
+            print("\n🟡 ОБНАРУЖЕНО: батарейка 'aa'")
+        elif crone_found:
+            print("\n🟡 ОБНАРУЖЕНО: компонент 'crone'")
+    
+    else:
+        print("Объекты не обнаружены")
+        print("🟢 Безопасно")
+
+
+def daemon_single_check(port):
+    """
+    Однократная проверка через запущенный detector_daemon.py
+    
+    Returns:
+        True, если демон ответил (модель и камера уже загружены в нем)
+    """
+    from detector_daemon import query_daemon
+    
+    response = query_daemon({'cmd': 'check'}, port=port)
+    if response is None:
+        return False
+    
+    if not response.get('ok'):
+        print(f"Ошибка демона: {response.get('error')}")
+        return True
+    
+    print(f"Ответ демона за {response['latency_ms']:.0f} мс")
+    print_check_results(response['detected'])
+    return True
 
 
 def main():
     """Основная функция"""
-    try:
-        # Создаем детектор
-        detector = BatteryDetector(model_dir='tensorflow')
-        
-        # Меню
+    config = load_config()
+    
+    # Быстрая проверка без меню: python detector.py check
+    if sys.argv[1:] == ['check']:
+        choice = '3'
+    else:
+        # Меню показываем до загрузки модели
         print("\nВыберите режим работы:")
         print("1 - Непрерывный мониторинг (без превью)")
         print("2 - Непрерывный мониторинг (с превью)")
         print("3 - Однократная проверка")
+        print("4 - Пакетный мониторинг (без превью)")
+        print("5 - Конвейерный мониторинг (с превью)")
+        print("6 - Мониторинг с пропуском статичных кадров")
         print("0 - Выход")
         
         choice = input("\nВаш выбор: ").strip()
+    
+    if choice == '0':
+        print("Выход")
+        return
+    
+    # Если демон запущен - проверка без загрузки TensorFlow в этом процессе
+    if choice == '3' and daemon_single_check(config['daemon_port']):
+        return
+    
+    try:
+        # Создаем детектор
+        detector = BatteryDetector.from_config(config)
         
         if choice == '1':
             detector.monitor_camera(show_preview=False)
@@ -308,8 +772,12 @@ def main():
             detector.monitor_camera(show_preview=True)
         elif choice == '3':
             detector.single_check()
-        elif choice == '0':
-            print("Выход")
+        elif choice == '4':
+            detector.monitor_camera(show_preview=False, batch_size=8, batch_timeout=0.5)
+        elif choice == '5':
+            detector.monitor_pipeline(show_preview=True)
+        elif choice == '6':
+            detector.monitor_camera(show_preview=False, check_interval=0.2, motion_gating=True)
         else:
             print("Неверный выбор, запускаю мониторинг без превью...")
             detector.monitor_camera(show_preview=False)
@@ -322,10 +790,9 @@ def main():
 
 
 if __name__ == "__main__":
-    # Проверяем OpenCV
-    try:
-        import cv2
-        main()
-    except ImportError:
+    # Проверяем OpenCV (без импорта - он нужен только детектору)
+    if importlib.util.find_spec('cv2') is None:
         print("Ошибка: OpenCV не установлен!")
         print("Установите: pip install opencv-python")
+    else:
+        main()
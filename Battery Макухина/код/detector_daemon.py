@@ -0,0 +1,156 @@
+# detector_daemon.py
+# Постоянно запущенный детектор: модель и камера загружаются один раз,
+# а detector.py (режим "Однократная проверка") подключается к нему по
+# локальному сокету и не платит за импорт TensorFlow при каждом запуске
+import json
+import socket
+import socketserver
+import threading
+import time
+
+HOST = '127.0.0.1'
+
+
+def query_daemon(request, port=8765, timeout=10.0):
+    """
+    Запрос к демону (одна строка JSON туда и обратно)
+    
+    Returns:
+        Ответ демона (dict) или None, если демон не запущен
+    """
+    try:
+        sock = socket.create_connection((HOST, port), timeout=0.5)
+    except OSError:
+        return None
+    
+    try:
+        sock.settimeout(timeout)
+        sock.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        line = sock.makefile('r', encoding='utf-8').readline()
+    except OSError:
+        return None
+    finally:
+        sock.close()
+    
+    return json.loads(line) if line else None
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Обработка клиента: по одной команде JSON на строку"""
+    
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                response = {'ok': False, 'error': "Некорректный JSON"}
+            else:
+                response = self.server.detector_daemon.handle(request)
+            
+            self.wfile.write((json.dumps(response, ensure_ascii=False) + '\n').encode('utf-8'))
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class DetectorDaemon:
+    """Держит загруженную модель и открытую камеру, отвечает на запросы"""
+    
+    def __init__(self, detector, port=8765):
+        """
+        Args:
+            detector: загруженный BatteryDetector
+            port: порт на 127.0.0.1
+        """
+        self.detector = detector
+        self.port = port
+        self.lock = threading.Lock()  # детектор не потокобезопасен
+        self.stop = threading.Event()
+        self.latest = None  # последний кадр с камеры
+        self.cap = None
+    
+    def _capture_loop(self):
+        """Постоянно читаем камеру, чтобы проверка брала свежий кадр сразу"""
+        metrics = self.detector.metrics
+        while not self.stop.is_set():
+            with metrics.time('capture'):
+                ret, frame = self.cap.read()
+            if not ret:
+                metrics.count('read_errors')
+                time.sleep(0.1)
+                continue
+            metrics.tick('captured')
+            self.latest = frame
+    
+    def handle(self, request):
+        """Выполнение одной команды"""
+        cmd = request.get('cmd')
+        
+        if cmd == 'ping':
+            return {'ok': True, 'backend': self.detector.backend_name}
+        
+        if cmd == 'metrics':
+            return {'ok': True, 'metrics': self.detector.metrics.snapshot()}
+        
+        if cmd == 'check':
+            frame = self.latest
+            if frame is None:
+                return {'ok': False, 'error': "Нет кадров с камеры"}
+            
+            from postprocess import detections_to_list
+            
+            started = time.perf_counter()
+            with self.lock:
+                detected = self.detector.detect_frame(frame)
+            return {
+                'ok': True,
+                'detected': detections_to_list(detected),
+                'latency_ms': (time.perf_counter() - started) * 1000,
+            }
+        
+        return {'ok': False, 'error': f"Неизвестная команда: {cmd}"}
+    
+    def serve_forever(self):
+        """Запуск до Ctrl+C"""
+        self.cap = self.detector.open_camera()
+        if self.cap is None:
+            return
+        
+        threading.Thread(target=self._capture_loop, daemon=True).start()
+        
+        server = _Server((HOST, self.port), _RequestHandler)
+        server.detector_daemon = self
+        
+        print(f"Демон детектора слушает {HOST}:{self.port}")
+        print("Нажмите Ctrl+C для остановки")
+        
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\n\nОстановка по запросу пользователя (Ctrl+C)")
+        finally:
+            self.stop.set()
+            server.server_close()
+            self.cap.release()
+            print("Камера закрыта")
+
+
+def main():
+    from detector import BatteryDetector, load_config
+    
+    config = load_config()
+    detector = None
+    try:
+        detector = BatteryDetector.from_config(config)
+        DetectorDaemon(detector, config['daemon_port']).serve_forever()
+    except Exception as e:
+        print(f"Ошибка: {e}")
+    finally:
+        if detector:
+            detector.close()
+
+
+if __name__ == "__main__":
+    main()
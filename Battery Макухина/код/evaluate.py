@@ -0,0 +1,250 @@
+# evaluate.py
+# Офлайн-проверка модели на папках с фотографиями и видеофайлах (без камеры)
+import argparse
+import csv
+import os
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+
+def find_inputs(paths):
+    """Обход путей: папки рекурсивно, отдельные файлы как есть"""
+    images, videos = [], []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    full = os.path.join(root, name)
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        images.append(full)
+                    elif name.lower().endswith(VIDEO_EXTENSIONS):
+                        videos.append(full)
+        elif path.lower().endswith(VIDEO_EXTENSIONS):
+            videos.append(path)
+        else:
+            images.append(path)
+    return sorted(images), sorted(videos)
+
+
+def read_ground_truth(path, folder_labels=False):
+    """
+    Эталонные метки для файла
+    
+    Рядом с x.jpg (или x.mp4) лежит x.txt - по метке на строку, пустой файл
+    означает "объектов нет". С folder_labels меткой считается имя папки.
+    
+    Returns:
+        Множество меток или None, если эталона нет
+    """
+    label_file = os.path.splitext(path)[0] + '.txt'
+    if os.path.exists(label_file):
+        with open(label_file, 'r', encoding='utf-8') as f:
+            return {line.strip() for line in f if line.strip()}
+    
+    if folder_labels:
+        return {os.path.basename(os.path.dirname(path))}
+    
+    return None
+
+
+def iter_frames(images, videos, every=1, workers=4):
+    """
+    Поток кадров (имя файла, номер кадра, кадр) без загрузки всего набора в память
+    
+    Фотографии декодируются пулом потоков (cv2.imread отпускает GIL),
+    из видео берется каждый every-й кадр.
+    """
+    import cv2
+    
+    def submitted(pool):
+        # Читаем с опережением не больше чем на 2 * workers файлов
+        pending = deque()
+        for path in images:
+            pending.append((path, pool.submit(cv2.imread, path)))
+            if len(pending) >= workers * 2:
+                yield pending.popleft()
+        yield from pending
+    
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for path, future in submitted(pool):
+            frame = future.result()
+            if frame is None:
+                print(f"\nНе удалось прочитать: {path}")
+                continue
+            yield path, 0, frame
+    
+    for path in videos:
+        cap = cv2.VideoCapture(path)
+        index = 0
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if index % every == 0:
+                yield path, index, frame
+            index += 1
+        cap.release()
+
+
+def count_frames(images, videos, every=1):
+    """Ожидаемое число кадров (для прогресса)"""
+    import cv2
+    
+    total = len(images)
+    for path in videos:
+        cap = cv2.VideoCapture(path)
+        frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        total += (frames + every - 1) // every
+    return total
+
+
+def print_progress(done, total, started):
+    """Строка прогресса с полосой и скоростью"""
+    elapsed = max(time.time() - started, 1e-6)
+    width = 30
+    filled = int(width * done / total) if total else width
+    sys.stdout.write(f"\r[{'#' * filled}{'.' * (width - filled)}] {done}/{total} "
+                     f"{done / elapsed:6.1f} к/с")
+    sys.stdout.flush()
+
+
+def batched(iterable, size):
+    """Разбиение потока на пакеты"""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def evaluate(detector, paths, output, batch_size=8, every=1, folder_labels=False, ignore=()):
+    """
+    Прогон модели по файлам с записью предсказаний в CSV
+    
+    Args:
+        detector: BatteryDetector
+        paths: папки, фотографии и видеофайлы
+        output: путь к CSV (по строке на кадр)
+        batch_size: кадров на один запуск модели
+        every: брать каждый N-й кадр видео
+        folder_labels: использовать имя папки как эталонную метку
+        ignore: метки, которые не считаются объектами (например, 'not battary')
+    
+    Returns:
+        Counter со статистикой точности
+    """
+    images, videos = find_inputs(paths)
+    total = count_frames(images, videos, every)
+    print(f"Фотографий: {len(images)}, видео: {len(videos)}, кадров: {total}")
+    
+    stats = Counter()
+    ground_truth = {}
+    started = time.time()
+    done = 0
+    
+    with open(output, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['file', 'frame', 'top_label', 'top_confidence', 'objects',
+                         'labels', 'ground_truth', 'correct'])
+        
+        for batch in batched(iter_frames(images, videos, every), batch_size):
+            results = detector.detect_batch([frame for _, _, frame in batch])
+            
+            for (path, index, _), detected in zip(batch, results):
+                if path not in ground_truth:
+                    ground_truth[path] = read_ground_truth(path, folder_labels)
+                expected = ground_truth[path]
+                
+                predicted = {str(label) for label in detected['label']} - set(ignore)
+                top_label = str(detected['label'][0]) if len(detected) else ''
+                top_confidence = float(detected['confidence'][0]) if len(detected) else 0.0
+                
+                correct = ''
+                if expected is not None:
+                    expected = expected - set(ignore)
+                    correct = int(predicted == expected)
+                    stats['evaluated'] += 1
+                    stats['correct'] += correct
+                    for label in predicted | expected:
+                        if label in predicted and label in expected:
+                            stats[('tp', label)] += 1
+                        elif label in predicted:
+                            stats[('fp', label)] += 1
+                        else:
+                            stats[('fn', label)] += 1
+                
+                writer.writerow([path, index, top_label, f"{top_confidence:.4f}", len(detected),
+                                 ';'.join(str(label) for label in detected['label']),
+                                 ';'.join(sorted(expected)) if expected is not None else '',
+                                 correct])
+            
+            done += len(batch)
+            print_progress(done, total, started)
+    
+    print()
+    stats['frames'] = done
+    stats['seconds'] = time.time() - started
+    return stats
+
+
+def print_report(stats):
+    """Итоговая точность и precision/recall по меткам"""
+    print("=" * 50)
+    print(f"Кадров: {stats['frames']} за {stats['seconds']:.1f} с "
+          f"({stats['frames'] / max(stats['seconds'], 1e-6):.1f} к/с)")
+    
+    if not stats['evaluated']:
+        print("Эталонных меток не найдено - точность не считалась")
+        return
+    
+    print(f"С эталоном: {stats['evaluated']}, точность по кадрам: "
+          f"{stats['correct'] / stats['evaluated']:.1%}")
+    
+    labels = sorted({key[1] for key in stats if isinstance(key, tuple)})
+    for label in labels:
+        tp, fp, fn = stats[('tp', label)], stats[('fp', label)], stats[('fn', label)]
+        precision = tp / (tp + fp) if tp + fp else 0.0
+        recall = tp / (tp + fn) if tp + fn else 0.0
+        print(f"  {label:<12} precision {precision:.1%}  recall {recall:.1%}  (tp={tp} fp={fp} fn={fn})")
+    print("=" * 50)
+
+
+def main():
+    from detector import BatteryDetector, load_config
+    
+    parser = argparse.ArgumentParser(description="Офлайн-проверка детектора на файлах")
+    parser.add_argument('paths', nargs='+', help="папки с фотографиями, фотографии, видеофайлы")
+    parser.add_argument('-o', '--output', default='predictions.csv', help="CSV с предсказаниями")
+    parser.add_argument('--batch', type=int, default=8, help="кадров на один запуск модели")
+    parser.add_argument('--every', type=int, default=1, help="брать каждый N-й кадр видео")
+    parser.add_argument('--folder-labels', action='store_true',
+                        help="эталонная метка - имя папки с файлом")
+    parser.add_argument('--ignore', nargs='*', default=['not battary'],
+                        help="метки, которые не считаются объектами")
+    args = parser.parse_args()
+    
+    detector = None
+    try:
+        detector = BatteryDetector.from_config(load_config())
+        stats = evaluate(detector, args.paths, args.output, args.batch, args.every,
+                         args.folder_labels, args.ignore)
+        print_report(stats)
+        print(f"Предсказания сохранены: {args.output}")
+    except KeyboardInterrupt:
+        print("\n\nОстановка по запросу пользователя (Ctrl+C)")
+    finally:
+        if detector:
+            detector.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# events.py
+# Объединение покадровых детекций в события "объект появился / ушел"
+import json
+import queue
+import threading
+import time
+
+# Сообщения о появлении объектов (как в однократной проверке)
+MESSAGES = {
+    'aa': "⚠️ ОБНАРУЖЕНА БАТАРЕЙКА 'aa'!",
+    'crone': "⚠️ ОБНАРУЖЕН КОМПОНЕНТ 'crone'!",
+}
+
+
+def print_event(event):
+    """Подписчик по умолчанию: одна строка в консоль на начало и конец события"""
+    stamp = time.strftime('%H:%M:%S', time.localtime(event['time']))
+    prefix = f"[{event['source']}] " if event['source'] else ""
+    
+    if event['type'] == 'start':
+        message = MESSAGES.get(event['label'], f"Обнаружен объект '{event['label']}'")
+        print(f"[{stamp}] {prefix}{message} ({event['peak_confidence']:.1%})")
+    else:
+        print(f"[{stamp}] {prefix}'{event['label']}' ушел из кадра "
+              f"(длительность {event['end'] - event['start']:.1f} с, "
+              f"максимум {event['peak_confidence']:.1%}, кадров {event['frames']})")
+
+
+class EventTracker:
+    """
+    Трекер событий с гистерезисом
+    
+    Объект считается появившимся, когда его уверенность не ниже
+    on_threshold на min_frames проверках подряд, и ушедшим, когда
+    дольше hold_time его уверенность ниже off_threshold. Одна батарейка
+    в кадре дает два события (start и end), а не сообщение на каждый кадр.
+    
+    on_threshold должен совпадать с порогом детектора: объекты ниже
+    порога детектора до трекера не доходят, а объекты между порогами
+    молча не давали бы событий. min_frames > 1 защищает от одиночных
+    ложных срабатываний ценой задержки первого события на
+    (min_frames - 1) проверок, т.е. примерно (min_frames - 1) * check_interval.
+    
+    События передаются подписчикам (subscribe), складываются в очередь
+    (events) и дописываются в JSONL-журнал.
+    """
+    
+    def __init__(self, labels=('aa', 'crone'), on_threshold=0.5, off_threshold=0.4,
+                 min_frames=2, hold_time=1.5, log_path=None, queue_size=1000):
+        """
+        Args:
+            labels: отслеживаемые метки
+            on_threshold: уверенность для начала события (по умолчанию - порог детектора, 50%)
+            off_threshold: уверенность, ниже которой объект считается пропавшим
+                (не выше on_threshold)
+            min_frames: сколько проверок подряд нужно для начала события
+            hold_time: сколько секунд объект может пропадать, не завершая событие
+            log_path: JSONL-журнал событий (None - без журнала)
+            queue_size: размер очереди events (старые события выбрасываются)
+        """
+        self.labels = tuple(labels)
+        self.on_threshold = on_threshold
+        self.off_threshold = min(off_threshold, on_threshold)
+        self.min_frames = min_frames
+        self.hold_time = hold_time
+        self.log_path = log_path
+        
+        self.events = queue.Queue(queue_size)
+        self.subscribers = []
+        self.active = {}  # (источник, метка) -> открытое событие
+        self.hits = {}  # (источник, метка) -> (проверок подряд выше on_threshold, время первой)
+        self.lock = threading.Lock()
+        self._log = open(log_path, 'a', encoding='utf-8') if log_path else None
+    
+    def subscribe(self, callback):
+        """Подписка на события: callback(event) вызывается для start и end"""
+        self.subscribers.append(callback)
+    
+    def update(self, detected, source=None, timestamp=None):
+        """
+        Учет результата одной проверки
+        
+        Args:
+            detected: результат detect_frame
+            source: имя источника (камеры)
+            timestamp: время кадра (по умолчанию - текущее)
+        """
+        now = timestamp if timestamp is not None else time.time()
+        
+        # Лучшая уверенность каждой метки в этом кадре
+        best = {}
+        for obj in detected:
+            label = str(obj['label'])
+            best[label] = max(best.get(label, 0.0), float(obj['confidence']))
+        
+        with self.lock:
+            for label in self.labels:
+                key = (source, label)
+                confidence = best.get(label, 0.0)
+                event = self.active.get(key)
+                
+                if event is not None:
+                    if confidence >= self.off_threshold:
+                        event['end'] = now
+                        event['frames'] += 1
+                        event['peak_confidence'] = max(event['peak_confidence'], confidence)
+                    elif now - event['end'] >= self.hold_time:
+                        del self.active[key]
+                        self._emit('end', event, now)
+                
+                elif confidence >= self.on_threshold:
+                    count, first_seen = self.hits.get(key, (0, now))
+                    self.hits[key] = (count + 1, first_seen)
+                    if count + 1 >= self.min_frames:
+                        del self.hits[key]
+                        event = {
+                            'source': source,
+                            'label': label,
+                            'start': first_seen,
+                            'end': now,
+                            'peak_confidence': confidence,
+                            'frames': self.min_frames,
+                        }
+                        self.active[key] = event
+                        self._emit('start', event, now)
+                else:
+                    self.hits.pop(key, None)
+    
+    def flush(self):
+        """Завершение всех открытых событий (при остановке мониторинга)"""
+        with self.lock:
+            now = time.time()
+            for key, event in list(self.active.items()):
+                del self.active[key]
+                self._emit('end', event, now)
+            self.hits.clear()
+    
+    def close(self):
+        self.flush()
+        if self._log:
+            self._log.close()
+            self._log = None
+    
+    def _emit(self, kind, event, now):
+        record = dict(event, type=kind, time=now)
+        
+        if self._log:
+            self._log.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._log.flush()
+        
+        try:
+            self.events.put_nowait(record)
+        except queue.Full:
+            # Очередь никто не читает - выбрасываем самое старое событие
+            try:
+                self.events.get_nowait()
+            except queue.Empty:
+                pass
+            self.events.put_nowait(record)
+        
+        for callback in self.subscribers:
+            try:
+                callback(record)
+            except Exception as e:
+                print(f"Ошибка обработчика событий: {e}")
@@ -0,0 +1,249 @@
+# metrics.py
+# Задержки по стадиям, FPS и счетчики детектора (достаточно дешево, чтобы не выключать)
+import bisect
+import collections
+import csv
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Границы корзин гистограммы, мс: от 0.05 мс до ~50 с с шагом ~19%
+BUCKETS_MS = [0.05 * 1.19 ** i for i in range(80)]
+
+
+class LatencyHistogram:
+    """
+    Гистограмма задержек с фиксированными корзинами
+    
+    Запись - поиск корзины и увеличение счетчика, без хранения самих
+    замеров, поэтому память не растет. Перцентили оцениваются по верхней
+    границе корзины (погрешность не больше шага корзин, ~19%).
+    """
+    
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+    
+    def record(self, ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+    
+    def percentile(self, q):
+        """Оценка перцентиля q (0-100), мс"""
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max_ms, self.max_ms)
+        return self.max_ms
+    
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.total_ms / self.count if self.count else 0.0,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'max_ms': self.max_ms,
+        }
+
+
+class _Timer:
+    """Контекстный менеджер замера одной стадии"""
+    
+    __slots__ = ('metrics', 'stage', 'started')
+    
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+    
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+class Metrics:
+    """
+    Реестр метрик детектора
+    
+    - стадии (observe / time): гистограммы задержек с p50/p95/p99
+    - счетчики (count): кадры, пропуски, выброшенные кадры
+    - FPS (tick): частота событий за последние fps_window секунд
+    
+    Состояние читается через snapshot(), может отдаваться по HTTP
+    (serve) и записываться в CSV с ротацией (export_csv).
+    """
+    
+    def __init__(self, fps_window=5.0):
+        self.fps_window = fps_window
+        self.stages = collections.defaultdict(LatencyHistogram)
+        self.counters = collections.Counter()
+        self.ticks = collections.defaultdict(collections.deque)
+        self.started = time.time()
+        self._started_monotonic = time.monotonic()
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._server = None
+    
+    def time(self, stage):
+        """Замер стадии: with metrics.time('inference'): ..."""
+        return _Timer(self, stage)
+    
+    def observe(self, stage, seconds):
+        """Учет длительности стадии, сек"""
+        with self.lock:
+            self.stages[stage].record(seconds * 1000)
+    
+    def count(self, name, n=1):
+        """Увеличение счетчика"""
+        with self.lock:
+            self.counters[name] += n
+    
+    def tick(self, name, n=1):
+        """Событие для FPS-счетчика (заодно увеличивает одноименный счетчик)"""
+        now = time.monotonic()
+        with self.lock:
+            self.counters[name] += n
+            ticks = self.ticks[name]
+            for _ in range(n):
+                ticks.append(now)
+            while ticks and now - ticks[0] > self.fps_window:
+                ticks.popleft()
+    
+    def fps(self, name):
+        """Частота событий name за последние fps_window секунд"""
+        now = time.monotonic()
+        with self.lock:
+            ticks = self.ticks.get(name)
+            if not ticks:
+                return 0.0
+            recent = sum(1 for t in ticks if now - t <= self.fps_window)
+        # В первые секунды окно короче fps_window
+        return recent / max(min(self.fps_window, now - self._started_monotonic), 1e-6)
+    
+    def snapshot(self):
+        """Текущее состояние всех метрик (dict, пригодный для JSON)"""
+        with self.lock:
+            stages = {name: hist.summary() for name, hist in self.stages.items()}
+            counters = dict(self.counters)
+            fps_names = list(self.ticks)
+        return {
+            'uptime_s': time.time() - self.started,
+            'stages': stages,
+            'counters': counters,
+            'fps': {name: self.fps(name) for name in fps_names},
+        }
+    
+    def print_report(self):
+        """Сводка в консоль (в конце мониторинга)"""
+        snap = self.snapshot()
+        if not snap['stages']:
+            return
+        print("-" * 50)
+        print(f"{'стадия':<12} {'вызовов':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  (мс)")
+        for name, s in snap['stages'].items():
+            print(f"{name:<12} {s['count']:>8} {s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} "
+                  f"{s['p99_ms']:>8.1f} {s['max_ms']:>8.1f}")
+        for name, value in snap['fps'].items():
+            print(f"FPS {name}: {value:.1f}")
+        for name, value in snap['counters'].items():
+            if name not in snap['fps']:
+                print(f"{name}: {value}")
+        print("-" * 50)
+    
+    def serve(self, port, host='127.0.0.1'):
+        """
+        HTTP-эндпоинт с метриками: GET http://127.0.0.1:<port>/metrics -> JSON
+        
+        Сервер работает в фоновом потоке до close().
+        """
+        metrics = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') not in ('', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = json.dumps(metrics.snapshot(), ensure_ascii=False).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, *args):
+                pass  # не засоряем консоль запросами
+        
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        print(f"Метрики: http://{host}:{port}/metrics")
+    
+    def export_csv(self, path, interval=10.0, max_bytes=1024 * 1024, backups=3):
+        """
+        Периодическая запись сводки по стадиям в CSV с ротацией
+        
+        Args:
+            path: файл CSV
+            interval: период записи, сек
+            max_bytes: размер файла, после которого он переименовывается в path.1
+            backups: сколько старых файлов хранить
+        """
+        threading.Thread(target=self._csv_loop, args=(path, interval, max_bytes, backups),
+                         daemon=True).start()
+    
+    def _csv_loop(self, path, interval, max_bytes, backups):
+        header = ['time', 'stage', 'count', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'fps']
+        while not self._stop.wait(interval):
+            try:
+                if os.path.exists(path) and os.path.getsize(path) >= max_bytes:
+                    _rotate(path, backups)
+                
+                snap = self.snapshot()
+                new_file = not os.path.exists(path)
+                stamp = time.strftime('%Y-%m-%d %H:%M:%S')
+                with open(path, 'a', newline='', encoding='utf-8') as f:
+                    writer = csv.writer(f)
+                    if new_file:
+                        writer.writerow(header)
+                    for name, s in snap['stages'].items():
+                        writer.writerow([stamp, name, s['count'], f"{s['mean_ms']:.2f}",
+                                         f"{s['p50_ms']:.2f}", f"{s['p95_ms']:.2f}",
+                                         f"{s['p99_ms']:.2f}", f"{s['max_ms']:.2f}", ''])
+                    for name, value in snap['fps'].items():
+                        writer.writerow([stamp, name, snap['counters'].get(name, 0),
+                                         '', '', '', '', '', f"{value:.2f}"])
+            except OSError as e:
+                print(f"Ошибка записи метрик: {e}")
+    
+    def close(self):
+        self._stop.set()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def _rotate(path, backups):
+    """metrics.csv -> metrics.csv.1 -> metrics.csv.2 ..., самый старый удаляется"""
+    for i in range(backups - 1, 0, -1):
+        if os.path.exists(f"{path}.{i}"):
+            os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+    if backups > 0:
+        os.replace(path, f"{path}.1")
+    else:
+        os.remove(path)
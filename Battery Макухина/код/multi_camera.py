@@ -0,0 +1,238 @@
+# multi_camera.py
+# Мониторинг нескольких камер (боксов сортировки) одним процессом и одной моделью
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+import cv2
+
+from detector import BatteryDetector, DropOldestQueue, load_config
+
+
+class CameraSource:
+    """Источник кадров: камера или видеофайл (локальная замена камеры)"""
+    
+    def __init__(self, name, source, loop=True):
+        """
+        Args:
+            name: имя источника в выводе (например, "Бокс 1")
+            source: номер камеры или путь к видеофайлу
+            loop: перематывать видеофайл в начало по окончании
+        """
+        self.name = name
+        self.source = source
+        self.loop = loop
+        self.is_file = isinstance(source, str) and not source.isdigit()
+        self.frames = DropOldestQueue(1)  # только самый свежий кадр
+        self.latest = None
+        self.processed = 0
+        self.cap = None
+    
+    def open(self):
+        """Открытие источника, False при ошибке"""
+        source = self.source if self.is_file else int(self.source)
+        self.cap = cv2.VideoCapture(source)
+        if not self.cap.isOpened():
+            print(f"✗ Ошибка: не удалось открыть источник {self.name} ({self.source})")
+            return False
+        
+        if not self.is_file:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+        return True
+    
+    def capture_loop(self, stop):
+        """Поток захвата: держит в очереди только последний кадр"""
+        # Видеофайл отдаем с его собственной частотой кадров, как живую камеру
+        fps = self.cap.get(cv2.CAP_PROP_FPS) if self.is_file else 0
+        frame_delay = 1.0 / fps if fps and fps > 0 else 0
+        
+        while not stop.is_set():
+            started = time.time()
+            ret, frame = self.cap.read()
+            if not ret:
+                if self.is_file and self.loop:
+                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    continue
+                if self.is_file:
+                    print(f"[{self.name}] Видео закончилось")
+                    return
+                print(f"[{self.name}] Ошибка чтения кадра")
+                time.sleep(0.1)
+                continue
+            
+            self.latest = frame
+            self.frames.put_latest(frame)
+            
+            if frame_delay:
+                time.sleep(max(0, frame_delay - (time.time() - started)))
+    
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+
+
+class MultiCameraMonitor:
+    """
+    Мониторинг списка камер с одной загруженной моделью
+    
+    Каждый источник читается своим потоком, а планировщик по кругу
+    собирает свежие кадры со всех источников в общий пакет и отправляет
+    его в модель одним вызовом detect_batch.
+    """
+    
+    def __init__(self, detector, sources, batch_size=None):
+        """
+        Args:
+            detector: BatteryDetector (одна сессия TensorFlow на все камеры)
+            sources: список CameraSource
+            batch_size: максимум кадров в пакете (по умолчанию - число источников)
+        """
+        self.detector = detector
+        self.sources = sources
+        self.batch_size = batch_size or len(sources)
+        self._next = 0  # с какого источника начинать следующий круг
+    
+    def _collect_batch(self, timeout=0.1):
+        """
+        Сбор пакета: не больше одного кадра от источника за круг,
+        начиная каждый раз со следующего источника - никто не голодает
+        """
+        batch = []
+        count = len(self.sources)
+        deadline = time.time() + timeout
+        
+        while not batch and time.time() < deadline:
+            for offset in range(count):
+                if len(batch) >= self.batch_size:
+                    break
+                index = (self._next + offset) % count
+                try:
+                    batch.append((self.sources[index], self.sources[index].frames.get_nowait()))
+                except queue.Empty:
+                    continue
+                self._next = (index + 1) % count
+            if not batch:
+                time.sleep(0.005)
+        
+        return batch
+    
+    def run(self, show_preview=False):
+        """Запуск мониторинга до Ctrl+C (или 'q' в окне превью)"""
+        print("=" * 50)
+        print("ДЕТЕКТОР БАТАРЕЕК: НЕСКОЛЬКО КАМЕР")
+        print("=" * 50)
+        for source in self.sources:
+            print(f"  {source.name}: {source.source}")
+        print(f"Пакет: до {self.batch_size} кадров")
+        print("Нажмите Ctrl+C для остановки")
+        print("=" * 50)
+        
+        active = [source for source in self.sources if source.open()]
+        if not active:
+            print("Нет доступных источников")
+            return
+        self.sources = active
+        
+        stop = threading.Event()
+        workers = [
+            threading.Thread(target=source.capture_loop, args=(stop,), daemon=True)
+            for source in self.sources
+        ]
+        
+        def scheduler():
+            while not stop.is_set():
+                batch = self._collect_batch()
+                if not batch:
+                    continue
+                results = self.detector.detect_batch([frame for _, frame in batch])
+                for (source, _), detected in zip(batch, results):
+                    source.processed += 1
+                    self.detector._report_detections(detected, source=source.name)
+        
+        workers.append(threading.Thread(target=scheduler, daemon=True))
+        for worker in workers:
+            worker.start()
+        
+        started = time.time()
+        try:
+            while True:
+                if show_preview:
+                    for source in self.sources:
+                        if source.latest is not None:
+                            cv2.imshow(source.name, source.latest)
+                    if cv2.waitKey(30) & 0xFF == ord('q'):
+                        print("\nВыход по запросу (кнопка 'q' в окне)")
+                        break
+                else:
+                    time.sleep(0.2)
+        
+        except KeyboardInterrupt:
+            print("\n\nОстановка по запросу пользователя (Ctrl+C)")
+        finally:
+            stop.set()
+            for worker in workers:
+                worker.join(timeout=2)
+            self.detector.events.flush()
+            for source in self.sources:
+                source.release()
+            if show_preview:
+                cv2.destroyAllWindows()
+            
+            elapsed = max(time.time() - started, 1e-6)
+            print("Обработано кадров:")
+            for source in self.sources:
+                print(f"  {source.name}: {source.processed} ({source.processed / elapsed:.1f} к/с), "
+                      f"пропущено {source.frames.dropped}")
+            self.detector.metrics.print_report()
+
+
+def load_sources(config_path):
+    """
+    Загрузка списка источников из JSON:
+    [{"name": "Бокс 1", "source": 1}, {"name": "Бокс 2", "source": "bin2.mp4"}]
+    """
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    
+    sources = []
+    for i, item in enumerate(config):
+        if isinstance(item, dict):
+            sources.append(CameraSource(item.get('name', f"Камера {i + 1}"), item['source'],
+                                        loop=item.get('loop', True)))
+        else:
+            sources.append(CameraSource(f"Камера {item}", item))
+    return sources
+
+
+def main():
+    """Запуск: python multi_camera.py [cameras.json | источник1 источник2 ...] [--preview]"""
+    show_preview = '--preview' in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg != '--preview'] or ['cameras.json']
+    
+    if len(args) == 1 and args[0].endswith('.json'):
+        if not os.path.exists(args[0]):
+            print(f"Файл конфигурации не найден: {args[0]}")
+            print("Укажите источники: python multi_camera.py 0 1 bin3.mp4")
+            return
+        sources = load_sources(args[0])
+    else:
+        sources = [CameraSource(f"Камера {arg}", arg) for arg in args]
+    
+    detector = None
+    try:
+        config = load_config()
+        detector = BatteryDetector.from_config(config)
+        MultiCameraMonitor(detector, sources).run(show_preview=show_preview)
+    except Exception as e:
+        print(f"Ошибка: {e}")
+    finally:
+        if detector:
+            detector.close()
+
+
+if __name__ == "__main__":
+    main()
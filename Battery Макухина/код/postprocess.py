@@ -0,0 +1,186 @@
+# postprocess.py
+import numpy as np
+
+# Компактный результат детекции: одна запись на объект
+DETECTION_DTYPE = np.dtype([
+    ('label', 'U16'),
+    ('class_id', np.int16),
+    ('confidence', np.float32),
+    ('box', np.float32, (4,)),  # x1, y1, x2, y2 (NaN, если модель не отдает рамки)
+])
+
+
+def detections_to_list(detected):
+    """Структурированный массив -> список словарей (для JSON и печати)"""
+    return [
+        {
+            'label': str(obj['label']),
+            'confidence': float(obj['confidence']),
+            'class_id': int(obj['class_id']),
+        }
+        for obj in detected
+    ]
+
+
+def nms(boxes, scores, classes, iou_threshold):
+    """
+    Подавление пересекающихся рамок отдельно для каждого класса
+    
+    Args:
+        boxes: (N, 4) рамки x1, y1, x2, y2, отсортированные по убыванию scores
+        scores: (N,) уверенности
+        classes: (N,) классы
+        iou_threshold: рамки с IoU выше порога считаются дубликатами
+    
+    Returns:
+        Индексы оставшихся рамок (в порядке убывания уверенности)
+    """
+    # Сдвигаем рамки разных классов, чтобы они никогда не пересекались
+    offset = classes.astype(np.float32)[:, None] * (boxes.max() + 1)
+    shifted = boxes + offset
+    
+    x1, y1, x2, y2 = shifted.T
+    areas = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    order = np.argsort(-scores, kind='stable')
+    
+    keep = []
+    while order.size:
+        best = order[0]
+        keep.append(best)
+        rest = order[1:]
+        
+        w = np.clip(np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest]), 0, None)
+        inter = w * h
+        iou = inter / np.maximum(areas[best] + areas[rest] - inter, 1e-9)
+        
+        order = rest[iou <= iou_threshold]
+    
+    return np.array(keep, dtype=np.int64)
+
+
+class PostProcessor:
+    """
+    Векторная обработка выходов модели для одного кадра
+    
+    Порог по классам, сортировка по уверенности, top-k и (если модель
+    отдает рамки) NMS - без цикла Python по всем кандидатам.
+    """
+    
+    def __init__(self, labels, threshold=0.5, class_thresholds=None, top_k=None, nms_iou=None):
+        """
+        Args:
+            labels: список меток классов
+            threshold: порог уверенности по умолчанию
+            class_thresholds: пороги для отдельных меток, например {'crone': 0.7}
+            top_k: оставлять не больше k самых уверенных объектов
+            nms_iou: порог IoU для NMS (None - без NMS)
+        """
+        self.labels = np.array(labels, dtype=DETECTION_DTYPE['label'])
+        self.threshold = threshold
+        self.top_k = top_k
+        self.nms_iou = nms_iou
+        
+        self.thresholds = np.full(len(labels), threshold, dtype=np.float32)
+        for label, value in (class_thresholds or {}).items():
+            if label in labels:
+                self.thresholds[labels.index(label)] = value
+    
+    def empty(self):
+        """Пустой результат"""
+        return np.empty(0, dtype=DETECTION_DTYPE)
+    
+    def __call__(self, scores, classes, boxes=None):
+        """
+        Args:
+            scores: уверенности кандидатов (скаляр или массив)
+            classes: классы кандидатов
+            boxes: рамки кандидатов (N, 4) или None
+        
+        Returns:
+            Структурированный массив DETECTION_DTYPE, по убыванию уверенности
+        """
+        # Скалярные выходы (один кандидат) превращаются в массивы из одного элемента
+        scores = np.atleast_1d(np.asarray(scores, dtype=np.float32)).ravel()
+        classes = np.atleast_1d(np.asarray(classes)).ravel().astype(np.int64)
+        
+        # Если классов меньше, чем уверенностей, недостающие считаем классом 0
+        if len(classes) < len(scores):
+            classes = np.concatenate([classes, np.zeros(len(scores) - len(classes), dtype=np.int64)])
+        classes = classes[:len(scores)]
+        
+        known = (classes >= 0) & (classes < len(self.thresholds))
+        thresholds = np.full(len(scores), self.threshold, dtype=np.float32)
+        thresholds[known] = self.thresholds[classes[known]]
+        
+        index = np.flatnonzero(scores > thresholds)
+        index = index[np.argsort(-scores[index], kind='stable')]
+        
+        if boxes is not None:
+            boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+            if len(boxes) < len(scores):
+                boxes = None  # рамки не соответствуют кандидатам
+        
+        if self.nms_iou is not None and boxes is not None and len(index) > 1:
+            index = index[nms(boxes[index], scores[index], classes[index], self.nms_iou)]
+        
+        if self.top_k:
+            index = index[:self.top_k]
+        
+        detected = np.empty(len(index), dtype=DETECTION_DTYPE)
+        detected['confidence'] = scores[index]
+        detected['class_id'] = classes[index]
+        detected['box'] = boxes[index] if boxes is not None else np.nan
+        
+        kept_known = known[index]
+        detected['label'][kept_known] = self.labels[classes[index][kept_known]]
+        for i in np.flatnonzero(~kept_known):
+            detected['label'][i] = f'obj_{classes[index][i]}'
+        
+        return detected
+
+
+def merge_regions(results, regions, width, height, iou_threshold=0.5):
+    """
+    Объединение результатов по областям кадра (ROI и плитки) в один результат
+    
+    Рамки модели нормированы к своей области; они переводятся в доли всего
+    кадра, после чего дубликаты из перекрывающихся плиток убираются NMS.
+    Если модель не отдает рамок, от каждой метки остается самый уверенный объект.
+    
+    Args:
+        results: список результатов PostProcessor, по одному на область
+        regions: (R, 4) области x1, y1, x2, y2 в пикселях (см. preprocess.frame_regions)
+        width, height: размер кадра
+        iou_threshold: порог IoU для NMS
+    
+    Returns:
+        Структурированный массив DETECTION_DTYPE для всего кадра
+    """
+    regions = np.asarray(regions, dtype=np.float32)
+    scale = np.array([width, height, width, height], dtype=np.float32)
+    
+    parts = []
+    for detected, (x1, y1, x2, y2) in zip(results, regions):
+        if not len(detected):
+            continue
+        detected = detected.copy()
+        # Доли области -> пиксели кадра -> доли кадра
+        size = np.array([x2 - x1, y2 - y1, x2 - x1, y2 - y1], dtype=np.float32)
+        origin = np.array([x1, y1, x1, y1], dtype=np.float32)
+        detected['box'] = (detected['box'] * size + origin) / scale
+        parts.append(detected)
+    
+    if not parts:
+        return np.empty(0, dtype=DETECTION_DTYPE)
+    
+    merged = np.concatenate(parts)
+    merged = merged[np.argsort(-merged['confidence'], kind='stable')]
+    
+    if np.isnan(merged['box']).any():
+        # Без рамок дубликаты не отличить от разных объектов - лучший объект на метку
+        _, first = np.unique(merged['label'], return_index=True)
+        return merged[np.sort(first)]
+    
+    keep = nms(merged['box'], merged['confidence'], merged['class_id'], iou_threshold)
+    return merged[keep]
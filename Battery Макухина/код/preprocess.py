@@ -0,0 +1,182 @@
+# preprocess.py
+import numpy as np
+import cv2
+import time
+
+
+class FramePreprocessor:
+    """
+    Подготовка кадров OpenCV для модели Custom Vision без PIL
+    
+    Модель ждет RGB 320x320 float32 в диапазоне 0-255 (без нормализации).
+    Ресайз выполняется OpenCV в заранее выделенный uint8 буфер, а смена
+    каналов BGR -> RGB совмещена с приведением к float32 при записи во
+    входной буфер модели. Буферы переиспользуются от кадра к кадру.
+    """
+    
+    def __init__(self, size=(320, 320), max_batch=1, interpolation=cv2.INTER_AREA):
+        """
+        Args:
+            size: размер входа модели (ширина, высота)
+            max_batch: начальная вместимость пакетного буфера
+            interpolation: метод ресайза OpenCV (INTER_AREA ближе всего к PIL при уменьшении)
+        """
+        self.size = size
+        self.interpolation = interpolation
+        width, height = size
+        self._resized = np.empty((height, width, 3), dtype=np.uint8)
+        self.buffer = np.empty((max_batch, height, width, 3), dtype=np.float32)
+    
+    def new_buffer(self):
+        """Отдельный входной буфер одного кадра (для очередей конвейера)"""
+        width, height = self.size
+        return np.empty((height, width, 3), dtype=np.float32)
+    
+    def prepare(self, frame, out=None):
+        """
+        Подготовка одного кадра
+        
+        Args:
+            frame: numpy array изображения (BGR от OpenCV)
+            out: float32 массив 320x320x3 для результата (по умолчанию - buffer[0])
+        
+        Returns:
+            out с RGB изображением 0-255
+        """
+        if out is None:
+            out = self.buffer[0]
+        
+        cv2.resize(frame, self.size, dst=self._resized, interpolation=self.interpolation)
+        
+        # BGR -> RGB и uint8 -> float32 за один проход, без промежуточных массивов
+        np.copyto(out, self._resized[..., ::-1], casting='unsafe')
+        return out
+    
+    def prepare_batch(self, frames):
+        """
+        Подготовка пакета кадров
+        
+        Returns:
+            Представление буфера формы (N, 320, 320, 3); валидно до следующего вызова
+        """
+        if len(frames) > len(self.buffer):
+            width, height = self.size
+            self.buffer = np.empty((len(frames), height, width, 3), dtype=np.float32)
+        
+        for i, frame in enumerate(frames):
+            self.prepare(frame, self.buffer[i])
+        
+        return self.buffer[:len(frames)]
+
+
+class ChangeGate:
+    """
+    Дешевая проверка: изменилась ли сцена с момента последней детекции
+    
+    Кадр уменьшается до маленькой серой картинки и сравнивается с опорной
+    (той, на которой последний раз запускалась модель). Если заметно
+    изменилась достаточная доля пикселей - сцена считается изменившейся.
+    """
+    
+    def __init__(self, size=(64, 48), pixel_threshold=20, min_changed_fraction=0.002,
+                 max_skip_time=10.0):
+        """
+        Args:
+            size: размер уменьшенного кадра (ширина, высота)
+            pixel_threshold: изменение яркости пикселя, которое считается значимым (0-255)
+            min_changed_fraction: доля измененных пикселей для запуска модели
+            max_skip_time: не пропускать кадры дольше этого времени, сек
+        """
+        self.size = size
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_fraction = min_changed_fraction
+        self.max_skip_time = max_skip_time
+        
+        width, height = size
+        self._small = np.empty((height, width, 3), dtype=np.uint8)
+        self.reference = None
+        self.reference_time = 0
+        
+        # Счетчики
+        self.checked = 0
+        self.skipped = 0
+    
+    def changed(self, frame):
+        """
+        Args:
+            frame: numpy array изображения (BGR от OpenCV)
+            
+        Returns:
+            True, если нужно запускать модель; False - можно взять прошлый результат
+        """
+        self.checked += 1
+        
+        cv2.resize(frame, self.size, dst=self._small, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY)
+        now = time.time()
+        
+        if self.reference is not None and now - self.reference_time < self.max_skip_time:
+            diff = cv2.absdiff(gray, self.reference)
+            changed = np.count_nonzero(diff > self.pixel_threshold) / diff.size
+            if changed < self.min_changed_fraction:
+                self.skipped += 1
+                return False
+        
+        self.reference = gray
+        self.reference_time = now
+        return True
+    
+    def reset(self):
+        """Сброс опорного кадра (следующий кадр всегда пойдет в модель)"""
+        self.reference = None
+    
+    @property
+    def skip_ratio(self):
+        """Доля пропущенных кадров"""
+        return self.skipped / self.checked if self.checked else 0.0
+
+
+def frame_regions(width, height, rois=None, tiles=None, overlap=0.2, include_full=True):
+    """
+    Области кадра, которые отправляются в модель
+    
+    Args:
+        width, height: размер кадра в пикселях
+        rois: области интереса [x1, y1, x2, y2] в долях кадра (0-1);
+              None - весь кадр
+        tiles: сетка (столбцов, строк) для нарезки каждой области на
+               перекрывающиеся плитки; None - без нарезки
+        overlap: перекрытие соседних плиток (доля размера плитки)
+        include_full: при нарезке добавлять и саму область целиком
+                      (крупные объекты, разрезанные плитками)
+    
+    Returns:
+        int32 массив (R, 4) областей x1, y1, x2, y2 в пикселях
+    """
+    regions = []
+    for x1, y1, x2, y2 in rois or [(0.0, 0.0, 1.0, 1.0)]:
+        left, top = int(round(x1 * width)), int(round(y1 * height))
+        right, bottom = int(round(x2 * width)), int(round(y2 * height))
+        if right - left < 2 or bottom - top < 2:
+            continue
+        
+        if not tiles or tuple(tiles) == (1, 1):
+            regions.append((left, top, right, bottom))
+            continue
+        
+        if include_full:
+            regions.append((left, top, right, bottom))
+        
+        cols, rows = tiles
+        # Размер плитки с учетом перекрытия: cols плиток покрывают область
+        tile_w = (right - left) / (cols - (cols - 1) * overlap)
+        tile_h = (bottom - top) / (rows - (rows - 1) * overlap)
+        for row in range(rows):
+            for col in range(cols):
+                tx = left + col * tile_w * (1 - overlap)
+                ty = top + row * tile_h * (1 - overlap)
+                regions.append((int(tx), int(ty),
+                                min(int(round(tx + tile_w)), right),
+                                min(int(round(ty + tile_h)), bottom)))
+    
+    return np.array(regions, dtype=np.int32).reshape(-1, 4)
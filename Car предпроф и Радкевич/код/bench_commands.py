@@ -0,0 +1,109 @@
+import argparse
+import asyncio
+import socket
+import threading
+import time
+
+import numpy as np
+
+import raspberry_server
+from car_protocol import RttTracker, encode_command, parse_ack
+from raspberry_server import SerialWriter, handle_commands
+
+# ===== Бенчмарк канала команд через loopback =====
+# Сервер - тот же handle_commands, что и на Pi, но вместо serial
+# считает записи и имитирует передачу на 9600 бод (~1 мс на байт).
+
+
+class FakeSerial:
+    def __init__(self, baud=9600):
+        self.byte_time = 10 / baud  # 8N1: 10 бит на байт
+        self.writes = 0
+        self.commands = 0
+
+    def write(self, data):
+        self.writes += 1
+        self.commands += len(data.strip())
+        time.sleep(len(data) * self.byte_time)
+
+    def flush(self):
+        pass
+
+
+def start_server(ser):
+    ready = threading.Event()
+    port = []
+    serial_writer = SerialWriter(ser)
+    serial_writer.start()
+
+    async def run():
+        server = await asyncio.start_server(
+            lambda r, w: handle_commands(r, w, serial_writer), "127.0.0.1", 0)
+        port.append(server.sockets[0].getsockname()[1])
+        ready.set()
+        await server.serve_forever()
+
+    threading.Thread(target=asyncio.run, args=(run(),), daemon=True).start()
+    ready.wait()
+    return port[0], serial_writer
+
+
+def run(count, interval, burst):
+    ser = FakeSerial()
+    port, serial_writer = start_server(ser)
+    sock = socket.create_connection(("127.0.0.1", port))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    rtt = RttTracker()
+    samples = []
+    done = threading.Event()
+
+    def acks():
+        for line in sock.makefile("rb"):
+            seq = parse_ack(line)
+            if seq is not None:
+                ms = rtt.on_ack(seq)
+                if ms is not None:
+                    samples.append(ms)
+            if seq == count:
+                done.set()
+                return
+
+    threading.Thread(target=acks, daemon=True).start()
+
+    for seq in range(1, count + 1):
+        rtt.on_send(seq)
+        # в режиме burst команды летят без пауз - как автоповтор клавиши
+        sock.sendall(encode_command(seq, "f"))
+        if not burst:
+            time.sleep(interval)
+
+    done.wait(10)
+    time.sleep(0.5)  # даем serial дописать хвост
+    sock.close()
+    return np.array(samples), ser, serial_writer.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Command channel loopback benchmark")
+    parser.add_argument('--count', type=int, default=500, help="commands per run")
+    parser.add_argument('--interval', type=float, default=0.01, help="pause between commands, s")
+    args = parser.parse_args()
+
+    raspberry_server.LOG_COMMANDS = False
+
+    for name, burst in (("paced", False), ("burst", True)):
+        samples, ser, st = run(args.count, args.interval, burst)
+        if not len(samples):
+            print(f"{name}: no acks")
+            continue
+        print(f"{name:<6} sent {args.count}  acks {len(samples)}  "
+              f"rtt p50 {np.percentile(samples, 50):.2f} ms  p95 {np.percentile(samples, 95):.2f} ms  "
+              f"p99 {np.percentile(samples, 99):.2f} ms  "
+              f"serial writes {ser.writes} for {ser.commands} commands")
+        print(f"       serial queue max {st['max_queue']}, collapsed {st['collapsed']}, "
+              f"queue->write p50 {st['latency_p50_ms']:.2f} ms / p95 {st['latency_p95_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
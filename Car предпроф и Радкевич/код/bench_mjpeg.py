@@ -0,0 +1,168 @@
+import argparse
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+from mjpeg import MjpegParser, read_frames
+
+# ===== Бенчмарк приема MJPEG =====
+# Локальный сервер отдает поток 640x480 JPEG, клиент разбирает его
+# старым способом (bytes += chunk, find с начала) и через MjpegParser.
+# Отдельно меряется задержка: сервер шлет кадры с заданной частотой и
+# пишет в X-Timestamp время отправки, клиент сравнивает его с временем,
+# когда кадр вышел из read_frames.
+
+LATENCY_FPS = 20  # как raspberry_server.py
+LATENCY_LIMIT_MS = 20  # медиана выше - кадры где-то застревают
+
+
+def make_jpeg(width=640, height=480, quality=80):
+    # Синтетическая "сцена": градиент, фигуры и шум - размер JPEG как у камеры
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    img = np.dstack([np.broadcast_to(x, (height, width)),
+                     np.broadcast_to(y, (height, width)),
+                     np.full((height, width), 128, np.float32)]).astype(np.uint8)
+    cv2.rectangle(img, (100, 100), (300, 300), (0, 0, 255), -1)
+    cv2.circle(img, (450, 240), 80, (255, 255, 0), -1)
+    noise = np.random.default_rng(0).integers(0, 40, img.shape, dtype=np.uint8)
+    img = cv2.add(img, noise)
+    return cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+
+def start_server(jpg, fps, content_length):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
+            self.end_headers()
+            header = b'--frame\r\nContent-Type: image/jpeg\r\n'
+            if content_length:
+                header += b'Content-Length: %d\r\n' % len(jpg)
+            body = jpg + b'\r\n'
+            interval = 1.0 / fps if fps else 0
+            next_time = time.perf_counter()
+            try:
+                while True:
+                    self.wfile.write(header + b'X-Timestamp: %.6f\r\n\r\n' % time.time() + body)
+                    self.wfile.flush()
+                    if interval:
+                        next_time += interval
+                        time.sleep(max(0, next_time - time.perf_counter()))
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_legacy(url, duration, decode):
+    # Старый способ из laptop_client.py
+    stream = urllib.request.urlopen(url)
+    bytes_data = b""
+    frames = 0
+    peak = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < duration:
+        chunk = stream.read(1024)
+        if not chunk:
+            break
+        bytes_data += chunk
+        peak = max(peak, len(bytes_data))
+
+        a = bytes_data.find(b'\xff\xd8')
+        b = bytes_data.find(b'\xff\xd9')
+
+        if a != -1 and b != -1:
+            jpg = bytes_data[a:b + 2]
+            bytes_data = bytes_data[b + 2:]
+            if decode:
+                cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_COLOR)
+            frames += 1
+    stream.close()
+    return frames / (time.perf_counter() - started), peak
+
+
+def run_parser(url, duration, decode):
+    stream = urllib.request.urlopen(url)
+    parser = MjpegParser()
+    frames = 0
+    started = time.perf_counter()
+    for jpg in read_frames(stream, parser):
+        if decode:
+            cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_COLOR)
+        frames += 1
+        if time.perf_counter() - started >= duration:
+            break
+    stream.close()
+    return frames / (time.perf_counter() - started), len(parser.buffer)
+
+
+def run_latency(stream, duration):
+    # Задержка от отправки кадра сервером до выхода из read_frames, мс
+    parser = MjpegParser()
+    lags = []
+    started = time.perf_counter()
+    for _ in read_frames(stream, parser):
+        lags.append((time.time() - parser.timestamp) * 1000)
+        if time.perf_counter() - started >= duration:
+            break
+    stream.close()
+    return np.median(lags), max(lags)
+
+
+def open_requests(url):
+    # так поток открывает laptop_client.py
+    import requests
+    return requests.get(url, stream=True, timeout=5).raw
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MJPEG receive benchmark")
+    parser.add_argument('--fps', type=float, default=0, help="server frame rate (0 - as fast as possible)")
+    parser.add_argument('--duration', type=float, default=5.0, help="seconds per run")
+    parser.add_argument('--no-length', action='store_true', help="do not send Content-Length")
+    parser.add_argument('--decode', action='store_true', help="also decode frames with cv2.imdecode")
+    args = parser.parse_args()
+
+    jpg = make_jpeg()
+    server = start_server(jpg, args.fps, not args.no_length)
+    url = f"http://127.0.0.1:{server.server_address[1]}/video"
+
+    print(f"JPEG 640x480: {len(jpg) / 1024:.1f} KB, server fps: {args.fps or 'max'}, "
+          f"Content-Length: {'no' if args.no_length else 'yes'}, decode: {'yes' if args.decode else 'no'}")
+    for name, run in (("legacy", run_legacy), ("parser", run_parser)):
+        fps, buffer_size = run(url, args.duration, args.decode)
+        status = "OK" if fps >= 30 else "< 30 fps"
+        print(f"{name:<7} {fps:8.1f} fps  buffer peak {buffer_size / 1024:8.1f} KB  {status}")
+
+    server.shutdown()
+
+    # Задержка на потоке с паузами между кадрами: буфер чтения не должен
+    # ждать, пока наберется chunk_size
+    server = start_server(jpg, LATENCY_FPS, not args.no_length)
+    url = f"http://127.0.0.1:{server.server_address[1]}/video"
+    print(f"Latency at {LATENCY_FPS} fps:")
+    for name, opener in (("urllib", urllib.request.urlopen), ("requests", open_requests)):
+        try:
+            stream = opener(url)
+        except ImportError:
+            print(f"{name:<9} skipped (not installed)")
+            continue
+        median, worst = run_latency(stream, min(args.duration, 3.0))
+        status = "OK" if median <= LATENCY_LIMIT_MS else f"> {LATENCY_LIMIT_MS} ms"
+        print(f"{name:<9} median {median:6.1f} ms  max {worst:6.1f} ms  {status}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import argparse
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import numpy as np
+
+from car_protocol import RttTracker, encode_command, parse_ack
+from mjpeg import MjpegParser, read_frames
+
+# ===== Нагрузочный тест сервера Pi =====
+# Несколько зрителей /video и клиент команд одновременно: частота кадров
+# у каждого зрителя и задержка подтверждения команд. Без --host сервер
+# запускается локально с синтетической камерой и без serial.
+# Задержка кадра - от X-Timestamp (время съемки на Pi) до разбора у
+# зрителя; верна только с общими часами, т.е. для локального сервера.
+
+VIDEO_PORT = 8000
+COMMAND_PORT = 5000
+
+
+def wait_port(host, port, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.5).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def viewer(url, stop, counts, lags, index):
+    try:
+        stream = urllib.request.urlopen(url, timeout=5)
+        parser = MjpegParser()
+        for _ in read_frames(stream, parser):
+            counts[index] += 1
+            if parser.timestamp is not None:
+                lags.append((time.time() - parser.timestamp) * 1000)
+            if stop.is_set():
+                break
+        stream.close()
+    except OSError as e:
+        print(f"viewer {index}: {e}")
+
+
+def commander(host, stop, samples, interval):
+    sock = socket.create_connection((host, COMMAND_PORT))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    rtt = RttTracker()
+
+    def acks():
+        try:
+            for line in sock.makefile("rb"):
+                seq = parse_ack(line)
+                if seq is not None:
+                    ms = rtt.on_ack(seq)
+                    if ms is not None:
+                        samples.append(ms)
+        except OSError:
+            pass
+
+    threading.Thread(target=acks, daemon=True).start()
+    seq = 0
+    while not stop.is_set():
+        seq += 1
+        rtt.on_send(seq)
+        sock.sendall(encode_command(seq, "s"))  # стоп - безопасно для живой машинки
+        time.sleep(interval)
+    time.sleep(0.2)
+    sock.close()
+
+
+def run_level(host, viewers, duration, interval):
+    url = f"http://{host}:{VIDEO_PORT}/video"
+    stop = threading.Event()
+    counts = [0] * viewers
+    samples = []
+    lags = []
+
+    threads = [threading.Thread(target=viewer, args=(url, stop, counts, lags, i), daemon=True)
+               for i in range(viewers)]
+    threads.append(threading.Thread(target=commander, args=(host, stop, samples, interval), daemon=True))
+    for thread in threads:
+        thread.start()
+
+    time.sleep(1.0)  # разгон: подключение и первые кадры
+    start_counts = list(counts)
+    start_samples = len(samples)
+    start_lags = len(lags)
+    time.sleep(duration)
+    fps = [(c - s) / duration for c, s in zip(counts, start_counts)]
+    rtt = np.array(samples[start_samples:])
+    lag = np.array(lags[start_lags:])
+
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=3)
+    return fps, rtt, lag
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Car server load test")
+    parser.add_argument('--host', help="running server (default: start a local one with a fake camera)")
+    parser.add_argument('--viewers', type=int, nargs='+', default=[1, 2, 4, 8], help="viewer counts to test")
+    parser.add_argument('--duration', type=float, default=5.0, help="seconds per level")
+    parser.add_argument('--interval', type=float, default=0.02, help="pause between commands, s")
+    args = parser.parse_args()
+
+    server = None
+    host = args.host or "127.0.0.1"
+    if not args.host:
+        server = subprocess.Popen([sys.executable, "raspberry_server.py", "--fake-camera", "--no-serial"],
+                                  stdout=subprocess.DEVNULL)
+    try:
+        if not (wait_port(host, VIDEO_PORT) and wait_port(host, COMMAND_PORT)):
+            print("Server is not reachable")
+            return
+
+        print(f"{'viewers':>7} {'fps min':>8} {'fps avg':>8} {'rtt p50':>9} {'rtt p95':>9} {'rtt p99':>9}"
+              f" {'lag p50':>9} {'lag max':>9}")
+        for viewers in args.viewers:
+            fps, rtt, lag = run_level(host, viewers, args.duration, args.interval)
+            if not len(rtt):
+                rtt = np.array([float('nan')])
+            if args.host or not len(lag):
+                lag = np.array([float('nan')])  # часы Pi и ноутбука не совпадают
+            print(f"{viewers:>7} {min(fps):>8.1f} {np.mean(fps):>8.1f} "
+                  f"{np.percentile(rtt, 50):>7.2f}ms {np.percentile(rtt, 95):>7.2f}ms "
+                  f"{np.percentile(rtt, 99):>7.2f}ms "
+                  f"{np.percentile(lag, 50):>7.2f}ms {lag.max():>7.2f}ms")
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import json
+import re
+import threading
+import time
+
+# ===== Протокол команд ноутбук -> Pi =====
+# Одна команда (или пачка команд) - одна строка:
+#     b"<seq> <символы команд>\n"     например b"17 ff\n"
+# seq > 0 - нужен ответ b"A <seq>\n": Pi принял команды и поставил их в
+# очередь serial. Подтверждение накопительное - все более ранние seq тоже
+# приняты. seq = 0 - без ответа.
+# Строка без номера (b"f\n") принимается как команды без подтверждения.
+# Старый клиент шлет голые символы без "\n" (b"f"): строка с номером всегда
+# начинается с цифры, поэтому все, что начинается не с цифры, выполняется
+# сразу, не дожидаясь конца строки.
+#
+# В обратную сторону, кроме подтверждений, Pi сам присылает телеметрию
+# машинки: b"T <json>\n" - последнее известное состояние со строк,
+# которые Arduino пишет в serial.
+#
+# Повторы не выбрасываются: Arduino разгоняется на каждую повторную "f",
+# поэтому пачка уходит в serial целиком, но одной записью.
+
+COMMANDS = set("fblrsghud")
+MAX_LINE = 256  # длиннее - мусор, строка выбрасывается
+RTT_MAX_PENDING = 1000  # неподтвержденных отправок в RttTracker, старые забываются
+LEGACY = re.compile(rb"[^\d\n]*\n?")  # символы команд старого клиента
+
+
+MOTION = set("fblr")
+SERVO_PAIRS = ("gh", "ud")  # схват / отпуск, подъем / опускание
+
+
+def collapse_commands(commands):
+    # Сжатие очереди команд, скопившихся перед записью в serial:
+    # - стоп отменяет все движения перед ним;
+    # - из пары команд одного серво важна только последняя;
+    # - из движений остается только последнее направление.
+    # Итоговое состояние машинки то же, теряются только лишние ступени
+    # разгона (Arduino прибавляет скорость на каждую команду движения).
+    last_stop = commands.rfind("s")
+    if last_stop >= 0:
+        head = "".join(c for c in commands[:last_stop] if c not in MOTION and c != "s")
+        commands = head + commands[last_stop:]
+
+    for group in SERVO_PAIRS + ("".join(sorted(MOTION)),):
+        last = max(commands.rfind(c) for c in group)
+        if last >= 0:
+            commands = "".join(c for i, c in enumerate(commands) if c not in group or i == last)
+    return commands
+
+
+def encode_command(seq, commands):
+    return b"%d %s\n" % (seq, commands.encode())
+
+
+def encode_ack(seq):
+    return b"A %d\n" % seq
+
+
+def parse_ack(line):
+    # номер подтвержденной команды или None
+    parts = line.split()
+    if len(parts) == 2 and parts[0] == b"A" and parts[1].isdigit():
+        return int(parts[1])
+    return None
+
+
+# ===== Телеметрия Pi -> ноутбук =====
+PWM_LINE = re.compile(r"PWM L/R:\s*(\d+)\s*/\s*(\d+)")
+KEY_VALUE = re.compile(r"([A-Za-z_][\w ]*?)\s*[:=]\s*(-?[\d.]+)")
+
+
+def parse_status_line(line):
+    # Строка из serial -> обновление состояния (dict) или None
+    line = line.strip()
+    if not line:
+        return None
+    match = PWM_LINE.search(line)
+    if match:
+        return {"state": "moving", "pwm_left": int(match.group(1)), "pwm_right": int(match.group(2))}
+    if line == "STOP":
+        return {"state": "stop", "pwm_left": 0, "pwm_right": 0}
+    # Датчики в виде "DIST: 23 BAT=7.4"
+    values = {}
+    for key, value in KEY_VALUE.findall(line):
+        try:
+            values[key.strip().lower().replace(" ", "_")] = float(value)
+        except ValueError:
+            pass
+    return values or {"message": line}
+
+
+def encode_telemetry(state):
+    return b"T " + json.dumps(state, ensure_ascii=False).encode() + b"\n"
+
+
+def parse_telemetry(line):
+    # dict телеметрии или None, если строка - не телеметрия
+    if not line.startswith(b"T "):
+        return None
+    try:
+        return json.loads(line[2:])
+    except ValueError:
+        return None
+
+
+class CommandDecoder:
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        # Разбор всех полных строк; возвращает (символы команд, последний seq для ack)
+        self.buffer += data
+        commands = []
+        ack = 0
+        while self.buffer:
+            if not self.buffer[:1].isdigit():
+                # старый формат без номера: выполняем то, что уже пришло
+                match = LEGACY.match(self.buffer)
+                text = bytes(self.buffer[:match.end()])
+                del self.buffer[:match.end()]
+                commands.extend(c for c in text.decode(errors="ignore").lower() if c in COMMANDS)
+                continue
+
+            end = self.buffer.find(b"\n")
+            if end < 0:
+                if len(self.buffer) > MAX_LINE:
+                    self.buffer.clear()
+                break
+            line = bytes(self.buffer[:end]).strip()
+            del self.buffer[:end + 1]
+
+            seq, _, text = line.partition(b" ")
+            if not text:  # старый формат: просто символы
+                seq, text = b"0", line
+            if not seq.isdigit():
+                continue
+            commands.extend(c for c in text.decode(errors="ignore").lower() if c in COMMANDS)
+            ack = max(ack, int(seq))
+        return "".join(commands), ack
+
+
+class RttTracker:
+    # Время от отправки команды до подтверждения
+    def __init__(self):
+        self.lock = threading.Lock()  # отправка и подтверждения - разные потоки
+        self.sent = {}  # seq -> время отправки
+        self.last_ms = 0.0
+        self.avg_ms = 0.0
+        self.acked = 0
+
+    def on_send(self, seq):
+        with self.lock:
+            self.sent[seq] = time.perf_counter()
+            # сервер без подтверждений - словарь не растет бесконечно
+            while len(self.sent) > RTT_MAX_PENDING:
+                del self.sent[next(iter(self.sent))]
+
+    def on_ack(self, seq):
+        now = time.perf_counter()
+        with self.lock:
+            sent = self.sent.get(seq)
+            if sent is None:
+                return None
+            self.last_ms = (now - sent) * 1000
+            self.avg_ms = self.last_ms if not self.acked else 0.9 * self.avg_ms + 0.1 * self.last_ms
+            self.acked += 1
+            # подтверждение накопительное - более ранние тоже дошли
+            for old in [s for s in self.sent if s <= seq]:
+                del self.sent[old]
+            return self.last_ms
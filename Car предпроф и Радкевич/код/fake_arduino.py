@@ -0,0 +1,83 @@
+import argparse
+import os
+import select
+import time
+import tty
+
+# ===== Fake Arduino =====
+# Пара псевдотерминалов вместо машинки: сервер открывает выведенный путь
+# как serial-порт (raspberry_server.py --serial /dev/pts/N), а этот скрипт
+# читает команды с другой стороны так же медленно, как Arduino на 9600 бод,
+# и отвечает отладочными строками, как arduino_car.ino.
+
+MIN_SPEED = 50
+SPEED_STEP = 5
+
+
+def reply(master, text):
+    # ответ не должен блокировать, если сервер не читает serial
+    try:
+        os.write(master, text.encode())
+    except BlockingIOError:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Arduino car on a pty")
+    parser.add_argument('--baud', type=int, default=9600, help="simulated serial speed")
+    parser.add_argument('--quiet', action='store_true', help="do not print received commands")
+    parser.add_argument('--sensors', action='store_true', help="print fake sensor lines every second")
+    args = parser.parse_args()
+
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    os.set_blocking(master, False)
+    print(f"Serial port: {os.ttyname(slave)}")
+    print(f"Run: python raspberry_server.py --serial {os.ttyname(slave)}")
+
+    byte_time = 10 / args.baud  # 8N1: 10 бит на байт
+    speed = MIN_SPEED
+    moving = False
+    received = 0
+    battery = 8.4
+
+    reply(master, "Готов\r\n")
+    try:
+        while True:
+            ready, _, _ = select.select([master], [], [], 1.0)
+            if not ready:
+                if args.sensors:
+                    # строка "датчиков" для проверки телеметрии
+                    battery = max(6.0, battery - 0.01)
+                    reply(master, f"DIST: {20 + received % 50} BAT: {battery:.2f}\r\n")
+                continue
+            try:
+                data = os.read(master, 1024)
+            except BlockingIOError:
+                continue
+            time.sleep(len(data) * byte_time)  # скорость линии
+            for c in data.decode(errors="ignore"):
+                if c in "\r\n":
+                    continue
+                received += 1
+                if not args.quiet:
+                    print(f"[{received}] {c}")
+
+                # та же логика разгона, что в arduino_car.ino
+                if c in "fblr":
+                    speed = min(100, speed + SPEED_STEP) if moving else MIN_SPEED
+                    moving = True
+                    pwm = round(speed * 255 / 100)
+                    reply(master, f"PWM L/R: {pwm} / {pwm}\r\n")
+                elif c == "s":
+                    speed, moving = MIN_SPEED, False
+                    reply(master, "STOP\r\n")
+    except KeyboardInterrupt:
+        print(f"Received {received} commands")
+    finally:
+        os.close(master)
+        os.close(slave)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,75 +1,323 @@
 import cv2
+import queue
 import socket
+import threading
+import time
 import requests
 import numpy as np
+from collections import deque
+
+from car_protocol import RttTracker, encode_command, parse_ack, parse_telemetry
+from mjpeg import MjpegParser, read_frames
+from session import SessionWriter
+from vision import LineFollower, ObstacleDetector, ProcessorChain
 
 # ===== Настройки =====
 PI_HOST = "10.42.0.1"  # IP Raspberry Pi
 #PI_HOST = "192.168.1.85"  # IP Raspberry Pi
 PI_PORT = 5000
 VIDEO_URL = f"http://{PI_HOST}:8000/video"
+VIDEO_TIMEOUT = 5  # сек без данных - переподключение к видео
+LATEST_ONLY = True  # декодировать только самый свежий кадр, устаревшие выбрасывать
+COMMAND_ACKS = True  # просить у Pi подтверждения команд (для замера RTT)
+TELEMETRY_STALE = 2.0  # сек без телеметрии - показываем, что данные устарели
+RECORD_PATH = None  # файл записи сессии (кадры + команды), например "run1.carrec"; None - не писать
+VISION = False  # обработка кадров (препятствия, линия) и подсказка команды
+VISION_WORKERS = 2
+AUTO_DRIVE = False  # отправлять подсказанные команды машинке самим
+AUTO_INTERVAL = 0.2  # сек между автоматическими командами
+
+# ===== Управление =====
+KEYS = {
+    ord('w'): "f",  # вперед (стрелка вверх - 82)
+    ord('s'): "b",  # назад (стрелка вниз - 84)
+    ord('q'): "l",  # влево (стрелка влево - 81)
+    ord('e'): "r",  # вправо (стрелка вправо - 83)
+    32: "s",  # SPACE - стоп
+    ord('g'): "g",
+    ord('h'): "h",
+    ord('u'): "u",
+    ord('d'): "d",
+}
+
+
+# ===== Последний кадр =====
+# Слот на один элемент: писатель всегда перезаписывает, читатель берет
+# только самый свежий. Перезаписанные непрочитанными считаются выброшенными.
+class LatestFrame:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.item = None
+        self.seq = 0  # номер элемента, растет с каждым put
+        self.taken = 0  # номер последнего прочитанного
+        self.dropped = 0
+
+    def put(self, item):
+        with self.cond:
+            if self.seq != self.taken:
+                self.dropped += 1
+            self.item = item
+            self.seq += 1
+            self.cond.notify_all()
+
+    def get(self):
+        with self.cond:
+            self.taken = self.seq
+            return self.seq, self.item
+
+    def wait(self, last_seq, timeout):
+        # ждем элемент новее last_seq
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq != last_seq, timeout)
+            self.taken = self.seq
+            return self.seq, self.item
+
+
+# ===== Статистика видео =====
+class VideoStats:
+    def __init__(self, window=300):
+        self.received = 0
+        self.displayed = 0
+        self.delay_ms = 0.0
+        # Разница "приход - время съемки на Pi" включает расхождение часов;
+        # минимум по окну считаем базой, превышение над ним - задержкой сети
+        self.offsets = deque(maxlen=window)
+
+    def on_display(self, arrived, captured):
+        now = time.time()
+        delay = now - arrived  # ожидание + декодирование + отрисовка на ноутбуке
+        if captured is not None:
+            offset = arrived - captured
+            self.offsets.append(offset)
+            delay += offset - min(self.offsets)
+        self.displayed += 1
+        # сглаживание, чтобы цифра на экране не прыгала
+        self.delay_ms = delay * 1000 if self.displayed == 1 else 0.9 * self.delay_ms + 0.1 * delay * 1000
+
+    def text(self, dropped):
+        return (f"rx {self.received}  drop {dropped}  shown {self.displayed}  "
+                f"delay ~{self.delay_ms:.0f} ms")
+
+
+def decode(jpg):
+    return cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+# ===== Поток 1: прием видео =====
+# В режиме LATEST_ONLY поток только разбирает JPEG и кладет их в слот -
+# сокет вычитывается с той скоростью, с какой шлет Pi, а декодируется
+# лишь самый свежий кадр. Иначе каждый кадр декодируется по порядку.
+def receive_loop(stop, jpegs, frames, stats, recorder=None):
+    while not stop.is_set():
+        try:
+            stream = requests.get(VIDEO_URL, stream=True, timeout=(3, VIDEO_TIMEOUT))
+        except requests.RequestException as e:
+            print("Video connect error:", e)
+            time.sleep(1)
+            continue
+
+        print("Video stream connected")
+        parser = MjpegParser()
+        try:
+            for jpg in read_frames(stream.raw, parser):
+                if stop.is_set():
+                    break
+                stats.received += 1
+                arrived = time.time()
+                if recorder:
+                    recorder.frame(jpg, arrived, parser.timestamp)
+                if LATEST_ONLY:
+                    jpegs.put((jpg, arrived, parser.timestamp))
+                    continue
+                frame = decode(jpg)
+                if frame is not None:
+                    frames.put((frame, arrived, parser.timestamp))
+            else:
+                print("Video stream closed")
+        except Exception as e:
+            # зависший поток видео не мешает управлению - просто переподключаемся
+            print("Video stream error:", e)
+        finally:
+            stream.close()
+
 
-# ===== TCP connection =====
-sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-sock.connect((PI_HOST, PI_PORT))
-print("Connected to Raspberry Pi TCP server")
+# ===== Поток 1б: декодирование последнего кадра (LATEST_ONLY) =====
+def decode_loop(stop, jpegs, frames):
+    seq = 0
+    while not stop.is_set():
+        new_seq, item = jpegs.wait(seq, timeout=0.1)
+        if new_seq == seq or item is None:
+            continue
+        seq = new_seq
+        jpg, arrived, captured = item
+        frame = decode(jpg)
+        if frame is not None:
+            frames.put((frame, arrived, captured))
 
-# ===== Video stream =====
-stream = requests.get(VIDEO_URL, stream=True)
-bytes_data = b""
 
-print("Controls: arrows + SPACE, ESC to quit")
+# ===== Поток 2: отправка команд =====
+# Все нажатия, накопившиеся к моменту отправки, уходят одной строкой
+def command_loop(stop, sock, commands, rtt, recorder=None):
+    seq = 0
+    while not stop.is_set():
+        try:
+            batch = [commands.get(timeout=0.1)]
+        except queue.Empty:
+            continue
+        while True:
+            try:
+                batch.append(commands.get_nowait())
+            except queue.Empty:
+                break
 
-while True:
-    for chunk in stream.iter_content(chunk_size=1024):
-        bytes_data += chunk
+        seq += 1
+        try:
+            if COMMAND_ACKS:
+                rtt.on_send(seq)
+            sock.sendall(encode_command(seq if COMMAND_ACKS else 0, "".join(batch)))
+        except OSError:
+            print("Connection lost")
+            stop.set()
+            continue
+        if recorder:
+            recorder.command("".join(batch))
 
-        a = bytes_data.find(b'\xff\xd8')
-        b = bytes_data.find(b'\xff\xd9')
 
-        if a != -1 and b != -1:
-            jpg = bytes_data[a:b + 2]
-            bytes_data = bytes_data[b + 2:]
+# ===== Поток 2б: подтверждения команд и телеметрия =====
+def ack_loop(stop, sock, rtt, telemetry, recorder=None):
+    try:
+        for line in sock.makefile("rb"):
+            seq = parse_ack(line)
+            if seq is not None:
+                rtt.on_ack(seq)
+                continue
+            state = parse_telemetry(line)
+            if state is not None:
+                telemetry["state"] = state
+                telemetry["received"] = time.time()
+                if recorder:
+                    recorder.telemetry(line, telemetry["received"])
+    except OSError:
+        pass
+    if not stop.is_set():
+        print("Connection lost")
+        stop.set()
 
-            frame = cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_COLOR)
-            cv2.imshow("Video", frame)
 
-            key = cv2.waitKey(1) & 0xFF
-            command = None
+# ===== Телеметрия на видео =====
+def draw_telemetry(frame, telemetry):
+    state = telemetry["state"]
+    if state is None:
+        return
+    stale = time.time() - telemetry["received"] > TELEMETRY_STALE
+    color = (0, 0, 255) if stale else (0, 255, 255)
+    items = [f"{key}: {value}" for key, value in state.items() if key != "t"]
+    if stale:
+        items.append("(stale)")
+    for i, text in enumerate(items):
+        cv2.putText(frame, text, (10, 20 + 18 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+
+
+def make_vision():
+    # порядок - приоритет: стоп перед препятствием важнее линии
+    return ProcessorChain([ObstacleDetector(), LineFollower()], workers=VISION_WORKERS)
+
+
+def draw_overlay(frame, stats, dropped, telemetry, rtt=None):
+    cv2.putText(frame, stats.text(dropped), (10, frame.shape[0] - 10),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+    if rtt is not None and rtt.acked:
+        cv2.putText(frame, f"cmd rtt {rtt.avg_ms:.0f} ms", (10, frame.shape[0] - 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+    draw_telemetry(frame, telemetry)
+
+
+# ===== Поток 3 (главный): отрисовка и клавиатура =====
+def main():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.connect((PI_HOST, PI_PORT))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # команды без задержки Нейгла
+    print("Connected to Raspberry Pi TCP server")
+
+    stop = threading.Event()
+    jpegs = LatestFrame()  # принятые, еще не декодированные кадры
+    frames = LatestFrame()  # декодированные кадры для отрисовки
+    stats = VideoStats()
+    commands = queue.Queue()
+    rtt = RttTracker()
+    telemetry = {"state": None, "received": 0.0}  # последняя телеметрия машинки
+    recorder = SessionWriter(RECORD_PATH) if RECORD_PATH else None
+    if recorder:
+        print("Recording session to", RECORD_PATH)
+    vision = make_vision() if VISION else None
+    last_auto = 0.0
+
+    workers = [
+        threading.Thread(target=receive_loop, args=(stop, jpegs, frames, stats, recorder), daemon=True),
+        threading.Thread(target=command_loop, args=(stop, sock, commands, rtt, recorder), daemon=True),
+        threading.Thread(target=ack_loop, args=(stop, sock, rtt, telemetry, recorder), daemon=True),
+    ]
+    if LATEST_ONLY:
+        workers.append(threading.Thread(target=decode_loop, args=(stop, jpegs, frames), daemon=True))
+    for worker in workers:
+        worker.start()
+
+    print("Controls: w/s/q/e + SPACE, ESC to quit")
+
+    # Окно есть сразу, чтобы клавиши работали еще до первого кадра
+    placeholder = np.zeros((480, 640, 3), dtype=np.uint8)
+    cv2.putText(placeholder, "Waiting for video...", (170, 240),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+    cv2.imshow("Video", placeholder)
+    shown = 0
+
+    try:
+        # Окна OpenCV обновляются из главного потока; клавиатура опрашивается
+        # каждые 10 мс независимо от того, пришел ли новый кадр
+        while not stop.is_set():
+            seq, item = frames.get()
+            if seq != shown:
+                shown = seq
+                frame, arrived, captured = item
+                stats.on_display(arrived, captured)
+                if vision:
+                    vision.submit(frame.copy())  # копия: на кадре дальше рисуем
+                    vision.draw(frame, vision.latest)
+                draw_overlay(frame, stats, jpegs.dropped + frames.dropped, telemetry, rtt)
+                cv2.imshow("Video", frame)
+
+            if vision:
+                for result in vision.results():
+                    if AUTO_DRIVE and result["suggest"] and time.time() - last_auto >= AUTO_INTERVAL:
+                        commands.put(result["suggest"])
+                        last_auto = time.time()
+
+            key = cv2.waitKey(10) & 0xFF
 
             if key == 27:  # ESC
                 print("Exit")
-                sock.close()
-                cv2.destroyAllWindows()
-                exit(0)
-           # elif key == 82:
-            elif key == ord('w'):
-                command = "f"
-           # elif key == 84:
-            elif key == ord('s'):
-                command = "b"
-           # elif key == 81:
-            elif key == ord('q'):
-                command = "l"
-            #elif key == 83:
-            elif key == ord('e'):
-                command = "r"
-            elif key == 32:
-                command = "s"
-            elif key == ord('g'):
-                command = "g"
-            elif key == ord('h'):
-                command = "h"
-            elif key == ord('u'):
-                command = "u"
-            elif key == ord('d'):
-                command = "d"
-
+                break
 
             # отправка команды каждый раз при нажатии клавиши
+            command = KEYS.get(key)
             if command:
-                try:
-                    sock.send(command.encode())
-                except BrokenPipeError:
-                    print("Connection lost")
-                    exit(1)
+                commands.put(command)
+    except KeyboardInterrupt:
+        print("Exit")
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join(timeout=1)
+        sock.close()
+        cv2.destroyAllWindows()
+        print("Video:", stats.text(jpegs.dropped + frames.dropped))
+        if vision:
+            vision.close()
+            print(vision.report())
+        if recorder:
+            recorder.close()
+            print(f"Recorded {recorder.records} records to {RECORD_PATH} (dropped {recorder.dropped})")
+
+
+if __name__ == "__main__":
+    main()
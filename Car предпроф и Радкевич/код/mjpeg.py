@@ -0,0 +1,160 @@
+import re
+
+# ===== MJPEG parser =====
+# Разбор потока multipart/x-mixed-replace (или просто склеенных JPEG)
+# в заранее выделенном буфере: данные читаются прямо в буфер через
+# readinto/recv_into, поиск маркеров продолжается с места, где
+# остановился прошлый раз, а память не растет от кадра к кадру.
+
+SOI = b'\xff\xd8'  # начало JPEG
+EOI = b'\xff\xd9'  # конец JPEG
+MAX_HEADER = 4096  # сколько байт перед кадром хранить ради заголовков части
+CONTENT_LENGTH = re.compile(rb'content-length:\s*(\d+)', re.IGNORECASE)
+TIMESTAMP = re.compile(rb'x-timestamp:\s*([\d.]+)', re.IGNORECASE)  # время съемки на Pi
+
+
+class MjpegParser:
+    def __init__(self, capacity=1024 * 1024):
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.start = 0  # начало необработанных данных
+        self.end = 0  # конец записанных данных
+        self.scan = 0  # откуда продолжать поиск маркера
+        self.soi = -1  # позиция начала текущего JPEG (-1 - еще не найдено)
+        self.length = None  # Content-Length текущей части, если он был в заголовках
+        self.timestamp = None  # X-Timestamp последнего отданного кадра (None - нет заголовка)
+        self._part_timestamp = None
+
+        # Счетчики
+        self.frames_parsed = 0
+        self.bytes_received = 0
+        self.resyncs = 0  # сколько раз буфер сбрасывался (кадр больше буфера)
+
+    def writable(self, size=64 * 1024):
+        """Свободный хвост буфера для readinto (не меньше size байт, если возможно)"""
+        if len(self.buffer) - self.end < size:
+            self._compact()
+        if self.end == len(self.buffer):
+            # Кадр не помещается в буфер - выбрасываем все и ищем следующий
+            self.resyncs += 1
+            self._reset()
+        return self.view[self.end:]
+
+    def commit(self, n):
+        """Отметить n байт, записанных в writable()"""
+        self.end += n
+        self.bytes_received += n
+
+    def feed(self, data):
+        """Добавить кусок данных (для источников без readinto)"""
+        data = memoryview(data)
+        while len(data):
+            free = self.writable(len(data))
+            n = min(len(free), len(data))
+            free[:n] = data[:n]
+            self.commit(n)
+            data = data[n:]
+
+    def frames(self):
+        """Все полные JPEG, накопившиеся в буфере (bytes)"""
+        while True:
+            frame = self._next_frame()
+            if frame is None:
+                return
+            yield frame
+
+    def _next_frame(self):
+        buf = self.buffer
+
+        if self.soi < 0:
+            # Ищем начало JPEG; все до него - заголовки части multipart
+            pos = buf.find(SOI, max(self.scan, self.start), self.end)
+            if pos < 0:
+                # Мусор до начала кадра не копим: оставляем только хвост под заголовки
+                self.start = max(self.start, self.end - MAX_HEADER)
+                self.scan = max(self.end - 1, self.start)
+                return None
+            self.soi = pos
+            self.scan = pos + 2
+            headers = self.view[self.start:pos]
+            match = CONTENT_LENGTH.search(headers)
+            self.length = int(match.group(1)) if match else None
+            match = TIMESTAMP.search(headers)
+            self._part_timestamp = float(match.group(1)) if match else None
+
+        if self.length is not None:
+            # Длина известна - конец кадра без поиска, только проверяем маркер
+            frame_end = self.soi + self.length
+            if frame_end > self.end:
+                return None
+            if buf[frame_end - 2:frame_end] != EOI:
+                self.length = None  # длина не совпала с данными - ищем маркер конца
+                return self._next_frame()
+        else:
+            pos = buf.find(EOI, max(self.scan, self.soi + 2), self.end)
+            if pos < 0:
+                self.scan = max(self.end - 1, self.soi + 2)
+                return None
+            frame_end = pos + 2
+
+        frame = bytes(self.view[self.soi:frame_end])
+        self.start = self.scan = frame_end
+        self.soi = -1
+        self.length = None
+        self.timestamp = self._part_timestamp
+        self.frames_parsed += 1
+        return frame
+
+    def _compact(self):
+        # Переносим необработанный хвост в начало буфера
+        offset = self.soi if self.soi >= 0 else self.start
+        size = self.end - offset
+        if offset == 0:
+            return
+        self.view[:size] = self.view[offset:self.end]  # memoryview корректно копирует перекрытие
+        self.start = max(self.start - offset, 0)
+        self.scan = max(self.scan - offset, 0)
+        if self.soi >= 0:
+            self.soi -= offset
+        self.end = size
+
+    def _reset(self):
+        self.start = self.end = self.scan = 0
+        self.soi = -1
+        self.length = None
+
+
+def short_reader(raw):
+    """
+    Функция read(buf) -> n, которая возвращает уже пришедшие байты, а не
+    ждет заполнения всего buf. Обычный readinto у потоков http.client,
+    urllib3 (response.raw у requests) и socket.makefile блокирует до
+    полного буфера - кадры тогда приходят пачками с опозданием.
+    """
+    if hasattr(raw, "recv_into"):  # сокет
+        return raw.recv_into
+    if hasattr(raw, "readinto1"):  # http.client, socket.makefile('rb'), файлы
+        return raw.readinto1
+    if hasattr(raw, "read1"):  # urllib3 (response.raw у requests)
+        def read(buf):
+            data = raw.read1(len(buf))
+            buf[:len(data)] = data
+            return len(data)
+        return read
+    return raw.readinto
+
+
+def read_frames(raw, parser=None, chunk_size=64 * 1024):
+    """
+    Генератор JPEG-кадров из потока (response.raw у requests, ответ
+    urllib, socket.makefile('rb'), сокет, файл). Кадр отдается, как только
+    пришел его последний байт.
+    """
+    parser = parser or MjpegParser()
+    read = short_reader(raw)
+    while True:
+        n = read(parser.writable(chunk_size)[:chunk_size])
+        if not n:
+            return
+        parser.commit(n)
+        yield from parser.frames()
@@ -1,80 +1,476 @@
-import cv2
+import argparse
+import asyncio
 import socket
 import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
 import serial
-from flask import Flask, Response
+
+from car_protocol import (CommandDecoder, collapse_commands, encode_ack, encode_telemetry,
+                          parse_status_line)
+
+# ===== Network settings =====
+VIDEO_PORT = 8000  # MJPEG: http://<pi>:8000/video
+COMMAND_PORT = 5000  # TCP-команды
+LOG_COMMANDS = True  # печатать принятые команды
+TELEMETRY_RATE = 5  # рассылок телеметрии в секунду (только если состояние изменилось)
+CLIENT_BUFFER_LIMIT = 64 * 1024  # байт в буфере отправки клиента, больше - телеметрия пропускается
 
 # ===== Serial settings =====
 SERIAL_PORT = "/dev/ttyUSB0"   #  порт
 SERIAL_BAUD = 9600
+SERIAL_RATE = 50  # записей в serial в секунду, не больше
+SERIAL_QUEUE = 32  # команд в очереди; больше - очередь сжимается сразу
+SERIAL_STATS_INTERVAL = 30  # сек между строками статистики serial
+
+# ===== Video settings =====
+VIDEO_FPS = 20  # целевая частота кадров
+JPEG_QUALITY = 80  # начальное (и максимальное) качество JPEG
+VIDEO_SCALE = 1.0  # начальный (и максимальный) масштаб кадра
+MIN_FPS = 5
+MIN_QUALITY = 40
+MIN_SCALE = 0.5
+ENCODE_BUDGET = 0.5 / VIDEO_FPS  # сек на кодирование кадра, дольше - снижаем настройки
+RECOVER_TIME = 3.0  # сек без перегрузки до повышения настроек на одну ступень
+
 
 # ===== Open serial =====
-try:
-    ser = serial.Serial(SERIAL_PORT, SERIAL_BAUD, timeout=1)
-    print(f"Serial connected: {SERIAL_PORT} @ {SERIAL_BAUD}")
-except Exception as e:
-    print("Serial error:", e)
-    ser = None
-
-# ===== Flask video =====
-app = Flask(__name__)
-camera = cv2.VideoCapture(0)
-
-def gen_frames():
+def open_serial(port=SERIAL_PORT):
+    try:
+        ser = serial.Serial(port, SERIAL_BAUD, timeout=1)
+        print(f"Serial connected: {port} @ {SERIAL_BAUD}")
+        return ser
+    except Exception as e:
+        print("Serial error:", e)
+        return None
+
+
+# ===== Adaptive JPEG encoder =====
+# Процессор Pi и Wi-Fi - узкое место машинки. Если кодирование не
+# укладывается в бюджет или клиенты не успевают забирать кадры, настройки
+# снижаются по ступеням: сначала качество, потом размер, потом частота.
+# После RECOVER_TIME секунд без перегрузки - обратно, в обратном порядке.
+class AdaptiveEncoder:
+    def __init__(self, fps=VIDEO_FPS, quality=JPEG_QUALITY, scale=VIDEO_SCALE):
+        self.max_fps, self.max_quality, self.max_scale = fps, quality, scale
+        self.fps, self.quality, self.scale = fps, quality, scale
+        self.congested = False  # клиент не успел забрать кадр
+        self.last_change = time.time()
+        self.last_overload = 0.0
+
+    def encode(self, frame):
+        started = time.perf_counter()
+        if self.scale < 1.0:
+            frame = cv2.resize(frame, None, fx=self.scale, fy=self.scale,
+                               interpolation=cv2.INTER_AREA)
+        _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        self._adapt(time.perf_counter() - started)
+        return buffer.tobytes()
+
+    def report_backlog(self):
+        self.congested = True
+
+    def _adapt(self, encode_time):
+        now = time.time()
+        overloaded = encode_time > ENCODE_BUDGET or self.congested
+        self.congested = False
+
+        if overloaded:
+            self.last_overload = now
+            if now - self.last_change > 0.5:  # даем новой ступени подействовать
+                self._step(down=True)
+        elif now - max(self.last_change, self.last_overload) > RECOVER_TIME:
+            self._step(down=False)
+
+    def _step(self, down):
+        old = (self.quality, self.scale, self.fps)
+        if down:
+            if self.quality > MIN_QUALITY:
+                self.quality = max(MIN_QUALITY, self.quality - 10)
+            elif self.scale > MIN_SCALE:
+                self.scale = max(MIN_SCALE, round(self.scale * 0.75, 2))
+            elif self.fps > MIN_FPS:
+                self.fps = max(MIN_FPS, round(self.fps * 0.75))
+        else:
+            if self.fps < self.max_fps:
+                self.fps = min(self.max_fps, round(self.fps / 0.75))
+            elif self.scale < self.max_scale:
+                self.scale = min(self.max_scale, round(self.scale / 0.75, 2))
+            elif self.quality < self.max_quality:
+                self.quality = min(self.max_quality, self.quality + 10)
+
+        if (self.quality, self.scale, self.fps) != old:
+            self.last_change = time.time()
+            print(f"Video: quality {self.quality}, scale {self.scale:.2f}, fps {self.fps}")
+
+
+# ===== Camera broadcast =====
+# Один поток читает камеру и кодирует JPEG один раз на кадр, готовый кадр
+# передается в event loop. Все клиенты /video получают один и тот же
+# кадр; каждый ждет кадр новее уже отправленного, поэтому медленный
+# клиент пропускает кадры, а не тормозит остальных.
+class FrameBroadcaster:
+    def __init__(self, camera, encoder, loop):
+        self.camera = camera
+        self.encoder = encoder
+        self.loop = loop
+        self.part = None  # последний кадр, готовый к отправке (часть multipart)
+        self.seq = 0
+        self.subscribers = 0
+        self._new_frame = asyncio.Event()
+
+    def start(self):
+        threading.Thread(target=self._capture_loop, daemon=True).start()
+
+    def _capture_loop(self):
+        next_time = 0.0
+        while True:
+            # Камеру читаем всегда, чтобы в ее буфере не копились старые кадры
+            success, frame = self.camera.read()
+            if not success:
+                time.sleep(0.05)  # камера не отдала кадр - не крутим цикл вхолостую
+                continue
+            if not self.subscribers:
+                continue  # никто не смотрит - не тратим CPU на кодирование
+
+            # Кодируем не чаще целевой частоты
+            captured = time.time()
+            if captured < next_time:
+                continue
+            next_time = max(next_time + 1.0 / self.encoder.fps, captured)
+
+            jpg = self.encoder.encode(frame)
+            # Content-Length - клиенту не нужно искать конец кадра,
+            # X-Timestamp - время съемки для оценки задержки на ноутбуке
+            part = (
+                b'--frame\r\n'
+                b'Content-Type: image/jpeg\r\n'
+                b'Content-Length: %d\r\n'
+                b'X-Timestamp: %.3f\r\n\r\n' % (len(jpg), captured) + jpg + b'\r\n'
+            )
+            self.loop.call_soon_threadsafe(self._publish, part)
+
+    def _publish(self, part):
+        # выполняется в event loop
+        self.part = part
+        self.seq += 1
+        event, self._new_frame = self._new_frame, asyncio.Event()
+        event.set()
+
+    async def next_frame(self, last_seq):
+        while self.seq == last_seq:
+            await self._new_frame.wait()
+        return self.seq, self.part
+
+
+# ===== Fake camera =====
+# Синтетические кадры для проверки сервера без камеры (--fake-camera)
+class FakeCamera:
+    def __init__(self, width=640, height=480, fps=30):
+        self.width, self.height = width, height
+        self.interval = 1.0 / fps
+        self.next_time = time.perf_counter()
+        self.index = 0
+
+    def read(self):
+        self.next_time += self.interval
+        time.sleep(max(0, self.next_time - time.perf_counter()))
+        frame = np.full((self.height, self.width, 3), 60, dtype=np.uint8)
+        x = self.index * 5 % self.width
+        cv2.rectangle(frame, (x, 180), (x + 80, 300), (0, 200, 255), -1)
+        cv2.putText(frame, time.strftime('%H:%M:%S'), (10, 40),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        self.index += 1
+        return True, frame
+
+
+# ===== Serial writer =====
+# Запись в serial на 9600 бод блокирующая, поэтому ее делает отдельный
+# поток, а сетевые обработчики только добавляют команды в очередь и сразу
+# возвращаются. Записей не больше SERIAL_RATE в секунду: команды, пришедшие
+# за это время, уходят одной записью по порядку. Только если очередь
+# длиннее SERIAL_QUEUE (serial не успевает), она сжимается
+# (collapse_commands), поэтому не растет без предела.
+class SerialWriter:
+    def __init__(self, ser, rate=SERIAL_RATE):
+        self.ser = ser
+        self.min_interval = 1.0 / rate
+        self.cond = threading.Condition()
+        self.pending = ""
+        self.pending_since = 0.0
+
+        # Метрики
+        self.received = 0  # команд принято
+        self.written = 0  # команд записано
+        self.collapsed = 0  # команд выброшено при сжатии
+        self.max_depth = 0  # максимальная длина очереди
+        self.latencies = deque(maxlen=1000)  # от постановки в очередь до записи, мс
+        self.write_times = deque(maxlen=1000)  # длительность write + flush, мс
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        threading.Thread(target=self._report_loop, daemon=True).start()
+
+    def submit(self, commands):
+        # не блокирует: event loop никогда не ждет serial
+        with self.cond:
+            if not self.pending:
+                self.pending_since = time.perf_counter()
+            self.pending += commands
+            self.received += len(commands)
+            if len(self.pending) > SERIAL_QUEUE:
+                self.pending = self._collapse(self.pending)
+            self.max_depth = max(self.max_depth, len(self.pending))
+            self.cond.notify()
+
+    def _collapse(self, commands):
+        collapsed = collapse_commands(commands)
+        self.collapsed += len(commands) - len(collapsed)
+        return collapsed
+
+    def _run(self):
+        last_write = 0.0
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pending)
+
+            # Ограничение частоты: пока ждем, команды копятся в одну запись
+            delay = last_write + self.min_interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+            with self.cond:
+                # по порядку и без сжатия: сжимается только переполненная очередь (submit)
+                commands = self.pending
+                since = self.pending_since
+                self.pending = ""
+
+            started = time.perf_counter()
+            if self.ser:
+                try:
+                    # ---- SEND TO SERIAL ----
+                    self.ser.write((commands + "\n").encode())
+                    self.ser.flush()
+                except (serial.SerialException, OSError) as e:
+                    print("Serial write error:", e)
+            last_write = time.perf_counter()
+            self.written += len(commands)
+            self.write_times.append((last_write - started) * 1000)
+            self.latencies.append((last_write - since) * 1000)
+
+    def stats(self):
+        latencies = np.array(self.latencies) if self.latencies else np.zeros(1)
+        write_times = np.array(self.write_times) if self.write_times else np.zeros(1)
+        return {
+            "received": self.received,
+            "written": self.written,
+            "collapsed": self.collapsed,
+            "queue": len(self.pending),
+            "max_queue": self.max_depth,
+            "latency_p50_ms": float(np.percentile(latencies, 50)),
+            "latency_p95_ms": float(np.percentile(latencies, 95)),
+            "write_p95_ms": float(np.percentile(write_times, 95)),
+        }
+
+    def _report_loop(self):
+        reported = 0
+        while True:
+            time.sleep(SERIAL_STATS_INTERVAL)
+            if self.received == reported:
+                continue  # команд не было - не шумим
+            reported = self.received
+            st = self.stats()
+            print(f"Serial: {st['received']} received, {st['written']} written, "
+                  f"{st['collapsed']} collapsed, queue max {st['max_queue']}, "
+                  f"latency p50 {st['latency_p50_ms']:.1f} ms / p95 {st['latency_p95_ms']:.1f} ms, "
+                  f"write p95 {st['write_p95_ms']:.1f} ms")
+
+
+# ===== Telemetry =====
+# Поток читает строки, которые Arduino пишет в serial, и собирает из них
+# последнее состояние машинки. Рассылка клиентам команд идет из event
+# loop не чаще TELEMETRY_RATE раз в секунду - ноутбуку не нужно ничего
+# опрашивать.
+class Telemetry:
+    def __init__(self, ser):
+        self.ser = ser
+        self.lock = threading.Lock()
+        self.state = {}
+        self.version = 0  # растет с каждым обновлением
+
+    def start(self):
+        if self.ser:
+            threading.Thread(target=self._read_loop, daemon=True).start()
+
+    def _read_loop(self):
+        while True:
+            try:
+                line = self.ser.readline()  # timeout=1 у порта - не висим вечно
+            except (serial.SerialException, OSError) as e:
+                print("Serial read error:", e)
+                time.sleep(1)
+                continue
+            update = parse_status_line(line.decode(errors="ignore"))
+            if update:
+                with self.lock:
+                    self.state.update(update)
+                    self.state["t"] = round(time.time(), 3)
+                    self.version += 1
+
+    def snapshot(self):
+        with self.lock:
+            return self.version, dict(self.state)
+
+
+async def push_telemetry(telemetry, clients, rate):
+    sent = 0
+    sent_time = 0.0
     while True:
-        success, frame = camera.read()
-        if not success:
+        await asyncio.sleep(1.0 / rate)
+        version, state = telemetry.snapshot()
+        # без изменений - только редкий повтор, чтобы ноутбук видел, что связь жива
+        if not version or (version == sent and time.time() - sent_time < 1.0):
             continue
-        _, buffer = cv2.imencode('.jpg', frame)
-        frame = buffer.tobytes()
-        yield (
-            b'--frame\r\n'
-            b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n'
-        )
-
-@app.route('/video')
-def video():
-    return Response(
-        gen_frames(),
-        mimetype='multipart/x-mixed-replace; boundary=frame'
-    )
+        sent = version
+        sent_time = time.time()
+        line = encode_telemetry(state)
+        for writer in list(clients):
+            # медленный клиент пропускает рассылку, а не копит ее в памяти
+            if writer.transport.get_write_buffer_size() < CLIENT_BUFFER_LIMIT:
+                writer.write(line)
 
-# ===== TCP command server =====
-def command_server():
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    s.bind(("0.0.0.0", 5000))
-    s.listen(1)
-    print("TCP server started on port 5000")
 
-    while True:
-        conn, addr = s.accept()
-        print(f"Client connected: {addr}")
+# ===== Video server =====
+async def handle_video(reader, writer, broadcaster):
+    try:
+        request = await reader.readline()
+        while (await reader.readline()).strip():
+            pass  # заголовки запроса не нужны
+    except ConnectionError:
+        writer.close()
+        return
+
+    parts = request.split()
+    if len(parts) < 2 or parts[0] != b'GET' or parts[1].split(b'?')[0] != b'/video':
+        writer.write(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+        writer.close()
+        return
 
+    peer = writer.get_extra_info('peername')
+    print(f"Video client connected: {peer}")
+    writer.write(
+        b'HTTP/1.1 200 OK\r\n'
+        b'Content-Type: multipart/x-mixed-replace; boundary=frame\r\n'
+        b'Cache-Control: no-cache\r\n'
+        b'Connection: close\r\n\r\n'
+    )
+
+    broadcaster.subscribers += 1
+    try:
+        seq = 0
         while True:
-            try:
-                data = conn.recv(1024)
-                if not data:
-                    print("Client disconnected")
-                    break
+            new_seq, part = await broadcaster.next_frame(seq)
+            if seq and new_seq - seq > 1:
+                # пока отправляли прошлый кадр, вышли новые - клиент не успевает
+                broadcaster.encoder.report_backlog()
+            seq = new_seq
+            writer.write(part)
+            await writer.drain()  # ждем, пока клиент заберет данные
+    except ConnectionError:
+        pass
+    finally:
+        broadcaster.subscribers -= 1
+        writer.close()
+        print(f"Video client disconnected: {peer}")
 
-                command = data.decode().strip()
-                print(f"Key pressed: {command}")
 
-                # ---- SEND TO SERIAL ----
-                if ser:
-                    ser.write((command + "\n").encode())
-                    ser.flush()
+# ===== TCP command server =====
+# Любое число клиентов одновременно, каждый в своей корутине
+async def handle_commands(reader, writer, serial_writer, telemetry=None, clients=None):
+    sock = writer.get_extra_info('socket')
+    if sock is not None:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # подтверждения без задержки
+    peer = writer.get_extra_info('peername')
+    print(f"Client connected: {peer}")
+
+    if clients is not None:
+        clients.add(writer)
+    if telemetry is not None:
+        version, state = telemetry.snapshot()
+        if version:
+            writer.write(encode_telemetry(state))  # новый клиент сразу видит состояние
 
-            except ConnectionResetError:
-                print("Client connection reset")
+    decoder = CommandDecoder()
+    try:
+        while True:
+            data = await reader.read(4096)
+            if not data:
+                print("Client disconnected")
                 break
 
-        conn.close()
-        print("Waiting for new client...")
+            commands, ack = decoder.feed(data)
+            if commands:
+                if LOG_COMMANDS:
+                    print(f"Commands: {commands}")
+                serial_writer.submit(commands)
+            if ack:
+                writer.write(encode_ack(ack))
+                await writer.drain()
+    except ConnectionError:
+        print("Client connection reset")
+    finally:
+        if clients is not None:
+            clients.discard(writer)
+        writer.close()
+
 
 # ===== Start =====
-if __name__ == "__main__":
+async def serve(args):
+    loop = asyncio.get_running_loop()
+
+    camera = FakeCamera() if args.fake_camera else cv2.VideoCapture(0)
+    broadcaster = FrameBroadcaster(camera, AdaptiveEncoder(), loop)
+    ser = None if args.no_serial else open_serial(args.serial)
+    serial_writer = SerialWriter(ser)
+    telemetry = Telemetry(ser)
+    clients = set()  # подключенные клиенты команд (для телеметрии)
+
+    video_server = await asyncio.start_server(
+        lambda r, w: handle_video(r, w, broadcaster), "0.0.0.0", VIDEO_PORT)
+    command_server = await asyncio.start_server(
+        lambda r, w: handle_commands(r, w, serial_writer, telemetry, clients), "0.0.0.0", COMMAND_PORT)
+
+    broadcaster.start()
+    serial_writer.start()
+    telemetry.start()
+    print(f"Video: http://0.0.0.0:{VIDEO_PORT}/video")
+    print(f"TCP server started on port {COMMAND_PORT}")
+
+    async with video_server, command_server:
+        await asyncio.gather(video_server.serve_forever(),
+                             command_server.serve_forever(),
+                             push_telemetry(telemetry, clients, args.telemetry_rate))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Raspberry Pi car server")
+    parser.add_argument('--fake-camera', action='store_true', help="synthetic frames instead of camera 0")
+    parser.add_argument('--no-serial', action='store_true', help="do not open the serial port")
+    parser.add_argument('--serial', default=SERIAL_PORT,
+                        help="serial port (a pty from fake_arduino.py for testing)")
+    parser.add_argument('--telemetry-rate', type=float, default=TELEMETRY_RATE,
+                        help="telemetry pushes per second")
+    args = parser.parse_args()
+
     print("Starting Raspberry Pi server")
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        print("Server stopped")
 
-    threading.Thread(target=command_server, daemon=True).start()
-    app.run(host="0.0.0.0", port=8000)
+
+if __name__ == "__main__":
+    main()
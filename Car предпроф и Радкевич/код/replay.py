@@ -0,0 +1,177 @@
+import argparse
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from car_protocol import parse_telemetry
+from laptop_client import LatestFrame, VideoStats, decode_loop, draw_overlay, make_vision
+from session import COMMAND, FRAME, TELEMETRY, SessionReader
+
+# ===== Воспроизведение записанной сессии =====
+# Кадры из записи идут через тот же конвейер, что и в laptop_client.py:
+# слот JPEG -> поток декодирования -> слот кадров -> отрисовка.
+# Управление: SPACE - пауза, a/d - назад/вперед на SEEK_STEP сек,
+# -/+ - скорость в 2 раза, ESC - выход.
+
+SEEK_STEP = 5.0
+
+
+class Playback:
+    # Часы воспроизведения: время сессии = база + прошедшее время * скорость
+    def __init__(self, session, speed):
+        self.session = session
+        self.times = session.index["time"]
+        self.speed = speed  # 0 - так быстро, как успевает декодер
+        self.paused = False
+        self.seek(session.start)
+
+    def position(self):
+        if self.paused:
+            return self.base_time
+        if self.speed == 0:
+            return self.session.end
+        return self.base_time + (time.monotonic() - self.base_wall) * self.speed
+
+    def seek(self, timestamp):
+        timestamp = min(max(timestamp, self.session.start), self.session.end)
+        self.base_time = timestamp
+        self.base_wall = time.monotonic()
+        self.next = int(np.searchsorted(self.times, timestamp))
+        # сразу показываем кадр, который был на экране к этому моменту
+        if len(self.session.frames):
+            self.next = min(self.next, int(self.session.frames[self.session.frame_at(timestamp)]))
+
+    def set_speed(self, speed):
+        self.base_time = self.position()
+        self.base_wall = time.monotonic()
+        self.speed = speed
+
+    def toggle_pause(self):
+        self.base_time = self.position()
+        self.base_wall = time.monotonic()
+        self.paused = not self.paused
+
+    def due(self):
+        # записи, время которых уже наступило
+        end = int(np.searchsorted(self.times, self.position(), side="right"))
+        if self.speed == 0:
+            end = min(end, self.next + 1)
+        records = range(self.next, max(end, self.next))
+        self.next = records.stop
+        return records
+
+    def finished(self):
+        return self.next >= len(self.times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded car session")
+    parser.add_argument('path', help="session file (.carrec)")
+    parser.add_argument('--speed', type=float, default=1.0, help="playback speed (0 - as fast as possible)")
+    parser.add_argument('--start', type=float, default=0.0, help="start position, seconds from the beginning")
+    parser.add_argument('--no-display', action='store_true', help="run the pipeline without a window (benchmark)")
+    parser.add_argument('--vision', action='store_true', help="run the frame processor chain")
+    args = parser.parse_args()
+
+    session = SessionReader(args.path)
+    print(f"Session: {len(session.index)} records, {len(session.frames)} frames, "
+          f"{session.end - session.start:.1f} s")
+
+    stop = threading.Event()
+    jpegs = LatestFrame()
+    frames = LatestFrame()
+    stats = VideoStats()
+    telemetry = {"state": None, "received": 0.0}
+    last_command = ("", 0.0)
+    playback = Playback(session, args.speed)
+    playback.seek(session.start + args.start)
+    vision = make_vision() if args.vision else None
+
+    decoder = threading.Thread(target=decode_loop, args=(stop, jpegs, frames), daemon=True)
+    decoder.start()
+
+    started = time.perf_counter()
+    shown = 0
+    try:
+        while True:
+            for record in playback.due():
+                kind = session.index["kind"][record]
+                payload = session.payload(record)
+                if kind == FRAME:
+                    source = session.index["source"][record]
+                    if playback.speed == 0:
+                        # без пауз, но и без выброса: ждем, пока декодер заберет прошлый кадр
+                        while jpegs.taken != jpegs.seq and not stop.is_set():
+                            time.sleep(0.0005)
+                    stats.received += 1
+                    jpegs.put((payload, time.time(), None if np.isnan(source) else source))
+                elif kind == COMMAND:
+                    last_command = (payload.decode(errors="ignore"), time.time())
+                elif kind == TELEMETRY:
+                    state = parse_telemetry(payload)
+                    if state is not None:
+                        telemetry["state"] = state
+                        telemetry["received"] = time.time()
+
+            seq, item = frames.get()
+            if seq != shown:
+                shown = seq
+                frame, arrived, captured = item
+                # время съемки из записи относится к прошлому - задержку считаем только локальную
+                stats.on_display(arrived, None)
+                if vision:
+                    vision.submit(frame if args.no_display else frame.copy())
+                if not args.no_display:
+                    if vision:
+                        vision.draw(frame, vision.latest)
+                    draw_overlay(frame, stats, jpegs.dropped + frames.dropped, telemetry)
+                    position = playback.position() - session.start
+                    status = "paused" if playback.paused else f"x{playback.speed:g}"
+                    cv2.putText(frame, f"{position:6.1f} s  {status}", (frame.shape[1] - 170, 20),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+                    command, when = last_command
+                    if command and time.time() - when < 1.0:
+                        cv2.putText(frame, f"cmd {command}", (frame.shape[1] - 170, 40),
+                                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+                    cv2.imshow("Replay", frame)
+
+            if args.no_display:
+                if playback.finished() and jpegs.taken == jpegs.seq and frames.taken == frames.seq:
+                    break
+                time.sleep(0.001)
+                continue
+
+            key = cv2.waitKey(1) & 0xFF
+            if key == 27:  # ESC
+                break
+            elif key == 32:
+                playback.toggle_pause()
+            elif key == ord('a'):
+                playback.seek(playback.position() - SEEK_STEP)
+            elif key == ord('d'):
+                playback.seek(playback.position() + SEEK_STEP)
+            elif key in (ord('-'), ord('+'), ord('=')):
+                speed = playback.speed or 1.0
+                playback.set_speed(speed / 2 if key == ord('-') else speed * 2)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        decoder.join(timeout=1)
+        if not args.no_display:
+            cv2.destroyAllWindows()
+        if vision:
+            vision.close()
+
+    elapsed = time.perf_counter() - started
+    print("Video:", stats.text(jpegs.dropped + frames.dropped))
+    print(f"Replayed in {elapsed:.1f} s, {stats.displayed / elapsed:.1f} fps shown")
+    if vision:
+        print(vision.report())
+    session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+
+import numpy as np
+
+# ===== Запись сессии =====
+# Контейнер только для дописывания, два файла:
+#   <name>.carrec     - заголовок файла и записи подряд:
+#                       kind (1 байт) | time (double) | source (double) | length (uint32) | данные
+#   <name>.carrec.idx - индекс: на каждую запись 32 байта
+#                       time | source | offset | length | kind
+# Кадры пишутся как пришли, в JPEG - без перекодирования.
+# time - время прихода на ноутбуке, source - время съемки на Pi (NaN, если неизвестно).
+# Индекс не обязателен: при чтении недостающий хвост восстанавливается
+# проходом по файлу данных (например, после аварийного завершения записи).
+
+MAGIC = b"CARREC1\n"
+FRAME = 1
+COMMAND = 2
+TELEMETRY = 3
+
+RECORD = struct.Struct("<BddI")
+INDEX_DTYPE = np.dtype({
+    "names": ["time", "source", "offset", "length", "kind"],
+    "formats": ["<f8", "<f8", "<u8", "<u4", "u1"],
+    "offsets": [0, 8, 16, 24, 28],
+    "itemsize": 32,
+})
+RECORD_QUEUE = 256  # записей в очереди на диск; при переполнении кадры выбрасываются
+FLUSH_INTERVAL = 1.0  # сек между сбросами на диск
+
+
+class SessionWriter:
+    # Запись идет в отдельном потоке: прием видео и отправка команд
+    # никогда не ждут диска
+    def __init__(self, path):
+        self.path = path
+        self.data = open(path, "wb")
+        self.index = open(path + ".idx", "wb")
+        self.data.write(MAGIC)
+        self.offset = len(MAGIC)
+        self.queue = queue.Queue(maxsize=RECORD_QUEUE)
+        self.records = 0
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def frame(self, jpg, timestamp=None, source=None):
+        self._put(FRAME, jpg, timestamp, source)
+
+    def command(self, commands, timestamp=None):
+        self._put(COMMAND, commands.encode(), timestamp)
+
+    def telemetry(self, line, timestamp=None):
+        # строка "T <json>" как пришла от Pi
+        self._put(TELEMETRY, line, timestamp)
+
+    def _put(self, kind, payload, timestamp, source=None):
+        record = (kind, time.time() if timestamp is None else timestamp,
+                  float("nan") if source is None else source, payload)
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                record = self.queue.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                record = ()
+            if record is None:
+                break
+            if record:
+                kind, timestamp, source, payload = record
+                self.data.write(RECORD.pack(kind, timestamp, source, len(payload)))
+                self.data.write(payload)
+                self.index.write(np.array([(timestamp, source, self.offset, len(payload), kind)],
+                                          dtype=INDEX_DTYPE).tobytes())
+                self.offset += RECORD.size + len(payload)
+                self.records += 1
+            if time.monotonic() - last_flush >= FLUSH_INTERVAL:
+                # индекс сбрасываем после данных - он не ссылается на незаписанное
+                self.data.flush()
+                self.index.flush()
+                last_flush = time.monotonic()
+        self.data.close()
+        self.index.close()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+
+# ===== Чтение сессии =====
+class SessionReader:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path}: not a session file")
+
+        self.index = self._load_index()
+        self.frames = np.flatnonzero(self.index["kind"] == FRAME)  # номера записей с кадрами
+        self.frame_times = self.index["time"][self.frames]
+        self.start = self.index["time"][0] if len(self.index) else 0.0
+        self.end = self.index["time"][-1] if len(self.index) else 0.0
+
+    def _load_index(self):
+        index = np.zeros(0, dtype=INDEX_DTYPE)
+        offset = len(MAGIC)
+        idx_path = self.path + ".idx"
+        if os.path.exists(idx_path) and os.path.getsize(idx_path) >= INDEX_DTYPE.itemsize:
+            with open(idx_path, "rb") as f:
+                idx_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            count = len(idx_map) // INDEX_DTYPE.itemsize
+            index = np.frombuffer(idx_map, dtype=INDEX_DTYPE, count=count)
+            # записи индекса, ушедшие за конец данных, не считаются
+            ends = index["offset"] + RECORD.size + index["length"]
+            index = index[:np.searchsorted(ends, len(self.data), side="right")]
+            if len(index):
+                offset = int(ends[len(index) - 1])
+        tail = self._scan(offset)
+        return np.concatenate([index, tail]) if len(tail) else index
+
+    def _scan(self, offset):
+        # Восстановление индекса по файлу данных, начиная с offset
+        entries = []
+        while offset + RECORD.size <= len(self.data):
+            kind, timestamp, source, length = RECORD.unpack_from(self.data, offset)
+            if offset + RECORD.size + length > len(self.data):
+                break  # последняя запись оборвана
+            entries.append((timestamp, source, offset, length, kind))
+            offset += RECORD.size + length
+        return np.array(entries, dtype=INDEX_DTYPE)
+
+    def payload(self, record):
+        entry = self.index[record]
+        start = int(entry["offset"]) + RECORD.size
+        return self.data[start:start + int(entry["length"])]
+
+    def frame_at(self, timestamp):
+        # номер кадра (в self.frames), показанного к моменту timestamp
+        return max(0, int(np.searchsorted(self.frame_times, timestamp, side="right")) - 1)
+
+    def records_between(self, start, end):
+        # номера записей с start <= time < end
+        times = self.index["time"]
+        return range(int(np.searchsorted(times, start)), int(np.searchsorted(times, end)))
+
+    def close(self):
+        self.index = None
+        self.data.close()
+        self.file.close()
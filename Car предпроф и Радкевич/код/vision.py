@@ -0,0 +1,213 @@
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+# ===== Обработка кадров на ноутбуке =====
+# Цепочка обработчиков работает с декодированными кадрами в пуле потоков,
+# вне отрисовки: главный поток только отдает кадр и забирает готовые
+# результаты. Результаты выдаются строго в порядке кадров.
+#
+# Обработчик - класс с name, budget_ms, process(frame) -> dict и draw(frame, output).
+# В output обработчик может положить "suggest" - предлагаемую команду
+# машинке ("f", "l", "r", "s"). Из цепочки побеждает первый обработчик
+# с предложением, поэтому более важные (препятствия) ставятся раньше.
+
+
+# ===== Обработчики =====
+class ObstacleDetector:
+    # Препятствие - пятно заданного цвета (по умолчанию красное) в нижней
+    # половине кадра. Близкое и по центру - стоп, сбоку - объезд.
+    name = "obstacle"
+
+    def __init__(self, ranges=(((0, 120, 70), (10, 255, 255)), ((170, 120, 70), (180, 255, 255))),
+                 min_area=0.005, near_area=0.08, budget_ms=15):
+        self.ranges = [(np.array(lo, np.uint8), np.array(hi, np.uint8)) for lo, hi in ranges]
+        self.min_area = min_area  # доля кадра, меньше - шум
+        self.near_area = near_area  # доля кадра, больше - препятствие вплотную
+        self.budget_ms = budget_ms
+
+    def process(self, frame):
+        height, width = frame.shape[:2]
+        top = height // 2
+        hsv = cv2.cvtColor(frame[top:], cv2.COLOR_BGR2HSV)
+        mask = None
+        for lo, hi in self.ranges:
+            part = cv2.inRange(hsv, lo, hi)
+            mask = part if mask is None else cv2.bitwise_or(mask, part)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((5, 5), np.uint8))
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        boxes = []
+        for contour in contours:
+            if cv2.contourArea(contour) < self.min_area * width * height:
+                continue
+            x, y, w, h = cv2.boundingRect(contour)
+            boxes.append((x, y + top, w, h))
+        output = {"boxes": boxes}
+        if not boxes:
+            return output
+
+        # самое большое препятствие - самое близкое
+        x, y, w, h = max(boxes, key=lambda b: b[2] * b[3])
+        area = w * h / (width * height)
+        center = (x + w / 2) / width
+        if area >= self.near_area:
+            output["suggest"] = "s"
+        elif area >= self.near_area / 4 and 1 / 3 < center < 2 / 3:
+            # впереди, но еще не вплотную - объезжаем в свободную сторону
+            output["suggest"] = "r" if center < 0.5 else "l"
+        return output
+
+    def draw(self, frame, output):
+        for x, y, w, h in output.get("boxes", ()):
+            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 0, 255), 2)
+
+
+class LineFollower:
+    # Темная линия на светлом полу в нижней полосе кадра: отклонение
+    # центра линии от середины -> поворот
+    name = "line"
+
+    def __init__(self, strip=0.25, deadband=0.1, min_pixels=0.02, budget_ms=5):
+        self.strip = strip  # доля высоты кадра снизу
+        self.deadband = deadband  # отклонение, при котором еще едем прямо
+        self.min_pixels = min_pixels  # доля полосы, меньше - линии нет
+        self.budget_ms = budget_ms
+
+    def process(self, frame):
+        height, width = frame.shape[:2]
+        top = int(height * (1 - self.strip))
+        gray = cv2.cvtColor(frame[top:], cv2.COLOR_BGR2GRAY)
+        _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+        moments = cv2.moments(mask, binaryImage=True)
+        if moments["m00"] < self.min_pixels * mask.size:
+            return {}
+        cx = moments["m10"] / moments["m00"]
+        offset = cx / width - 0.5
+        if offset < -self.deadband:
+            suggest = "l"
+        elif offset > self.deadband:
+            suggest = "r"
+        else:
+            suggest = "f"
+        return {"x": int(cx), "top": top, "offset": offset, "suggest": suggest}
+
+    def draw(self, frame, output):
+        if "x" in output:
+            cv2.line(frame, (output["x"], output["top"]), (output["x"], frame.shape[0]), (255, 0, 0), 2)
+
+
+# ===== Цепочка =====
+class StageStats:
+    def __init__(self):
+        self.runs = 0
+        self.skipped = 0
+        self.overruns = 0  # сколько раз стадия не уложилась в бюджет
+        self.avg_ms = 0.0
+
+
+class ProcessorChain:
+    def __init__(self, processors, workers=2, max_pending=None):
+        self.processors = processors
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vision")
+        self.max_pending = max_pending or workers  # больше кадров в работе - новые выбрасываются
+        self.pending = deque()  # (номер кадра, future) в порядке поступления
+        self.lock = threading.Lock()
+        self.stats = {p.name: StageStats() for p in processors}
+        self.last_outputs = {p.name: {} for p in processors}  # для пропущенных кадров
+        self.submitted = 0
+        self.dropped = 0
+        self.done = 0
+        self.ready = []  # готовые, еще не забранные результаты
+        self.latest = None  # последний результат по порядку
+
+    def submit(self, frame):
+        # не блокирует: если пул не успевает, кадр пропускается
+        self._collect()
+        if len(self.pending) >= self.max_pending:
+            self.dropped += 1
+            return False
+        self.submitted += 1
+        self.pending.append((self.submitted, self.pool.submit(self._run, self.submitted, frame)))
+        return True
+
+    def results(self):
+        # Готовые результаты по порядку кадров; неготовый кадр задерживает следующие
+        self._collect()
+        ready, self.ready = self.ready, []
+        return ready
+
+    def _collect(self):
+        while self.pending and self.pending[0][1].done():
+            _, future = self.pending.popleft()
+            self.latest = future.result()
+            self.ready.append(self.latest)
+            self.done += 1
+
+    def _should_run(self, number, stats, budget_ms):
+        # Стадия, которая в среднем не укладывается в бюджет, запускается
+        # только на каждом n-м кадре (n = среднее время / бюджет)
+        if stats.avg_ms <= budget_ms:
+            return True
+        return number % math.ceil(stats.avg_ms / budget_ms) == 0
+
+    def _run(self, number, frame):
+        result = {"frame": number, "outputs": {}, "suggest": None, "ms": 0.0}
+        started = time.perf_counter()
+        for processor in self.processors:
+            stats = self.stats[processor.name]
+            with self.lock:
+                run = self._should_run(number, stats, processor.budget_ms)
+                if not run:
+                    # пропущенная стадия отдает прошлый ответ, иначе стоп от
+                    # препятствия перебило бы предложение следующей стадии
+                    stats.skipped += 1
+                    output = self.last_outputs[processor.name]
+
+            if run:
+                stage_started = time.perf_counter()
+                try:
+                    output = processor.process(frame)
+                except Exception as e:
+                    print(f"Vision {processor.name} error:", e)
+                    output = {}
+                ms = (time.perf_counter() - stage_started) * 1000
+
+                with self.lock:
+                    stats.runs += 1
+                    stats.avg_ms = ms if stats.runs == 1 else 0.9 * stats.avg_ms + 0.1 * ms
+                    if ms > processor.budget_ms:
+                        stats.overruns += 1
+                    self.last_outputs[processor.name] = output
+            result["outputs"][processor.name] = output
+            if result["suggest"] is None and output.get("suggest"):
+                result["suggest"] = output["suggest"]
+        result["ms"] = (time.perf_counter() - started) * 1000
+        return result
+
+    def draw(self, frame, result):
+        if result is None:
+            return
+        for processor in self.processors:
+            output = result["outputs"].get(processor.name)
+            if output:
+                processor.draw(frame, output)
+        if result["suggest"]:
+            cv2.putText(frame, f"suggest: {result['suggest']}", (frame.shape[1] - 170, frame.shape[0] - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+
+    def report(self):
+        lines = [f"Vision: {self.done} frames processed, {self.dropped} skipped (pool busy)"]
+        for name, stats in self.stats.items():
+            lines.append(f"  {name:<10} avg {stats.avg_ms:6.1f} ms  runs {stats.runs}  "
+                         f"over budget {stats.overruns}  skipped {stats.skipped}")
+        return "\n".join(lines)
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        self._collect()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# bench_polling.py - сравнение последовательного и параллельного опроса ESP
+
+import argparse
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import requests
+
+from client import EmulatedESP, ESPDevice, ESPPoller
+
+def start_fake_esp(latency, hung=False):
+    """
+    Фейковый ESP на 127.0.0.1 со случайным портом: отвечает на /random
+    числом 1-6, как server.ino. Как и ESP8266WebServer, обслуживает
+    один запрос за раз.
+    
+    Args:
+        latency: задержка ответа, сек
+        hung: устройство "зависло" - отвечает дольше любого таймаута
+    Returns:
+        адрес "127.0.0.1:порт"
+    """
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+        
+        def do_GET(self):
+            time.sleep(10 if hung else latency)
+            body = str(random.randint(1, 6)).encode()
+            try:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # клиент уже ушел по таймауту
+        
+        def log_message(self, *args):
+            pass
+    
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"127.0.0.1:{server.server_address[1]}"
+
+def poll_sequential(devices, timeout):
+    """Старый способ: по очереди, новое соединение на каждый запрос"""
+    values = {}
+    for num, device in devices.items():
+        if device.backend == "emulator":
+            values[num] = device.read(None)
+            continue
+        try:
+            response = requests.get(f"http://{device.ip}/random", timeout=timeout)
+            values[num] = int(response.text.strip())
+        except requests.exceptions.RequestException:
+            values[num] = None
+    return values
+
+def run(name, poll, devices, cycles):
+    """Несколько циклов опроса, печать времени цикла"""
+    times = []
+    answered = 0
+    for _ in range(cycles):
+        started = time.perf_counter()
+        values = poll(devices)
+        times.append(time.perf_counter() - started)
+        answered += sum(1 for v in values.values() if v is not None)
+    print(f"{name:<11} cycle avg {sum(times) / len(times):6.3f} s  max {max(times):6.3f} s  "
+          f"answered {answered}/{len(devices) * cycles}")
+
+def main():
+    parser = argparse.ArgumentParser(description="ESP polling benchmark")
+    parser.add_argument("--devices", type=int, default=10, help="number of fake ESP devices")
+    parser.add_argument("--latency", type=float, default=0.05, help="response delay of one ESP, sec")
+    parser.add_argument("--hung", type=int, default=1, help="how many devices never answer in time")
+    parser.add_argument("--timeout", type=float, default=2, help="per-device timeout, sec")
+    parser.add_argument("--cycles", type=int, default=5, help="polling cycles per method")
+    parser.add_argument("--emulated", type=int, default=0, help="extra emulated devices (same latency)")
+    args = parser.parse_args()
+    
+    devices = {num: ESPDevice(f"ESP #{num + 1}", start_fake_esp(args.latency, hung=num < args.hung))
+               for num in range(args.devices)}
+    for num in range(args.devices, args.devices + args.emulated):
+        devices[num] = EmulatedESP(f"ESP #{num + 1}", fail_rate=0, latency=args.latency)
+    print(f"{args.devices} fake ESP + {args.emulated} emulated, latency {args.latency} s, "
+          f"hung {args.hung}, timeout {args.timeout} s")
+    
+    run("sequential", lambda d: poll_sequential(d, args.timeout), devices, args.cycles)
+    
+    poller = ESPPoller(timeout=args.timeout, max_workers=max(16, len(devices)))
+    run("concurrent", poller.poll, devices, args.cycles)
+    poller.close()
+
+if __name__ == "__main__":
+    main()
@@ -7,10 +7,168 @@ import requests
 import threading
 import time
 import json
+import math
+import os
 from datetime import datetime
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
 import random  # Для эмуляции, если ESP не доступен
 
+class ESPDevice:
+    """Реальный ESP: значение читается по HTTP (/random)"""
+    
+    backend = "http"
+    
+    def __init__(self, name, ip, interval=None):
+        self.name = name
+        self.ip = ip
+        self.interval = interval  # секунд между опросами (None - общий интервал)
+        self.last_poll = 0.0
+    
+    def read(self, poller):
+        """Текущее значение 1-6 или None"""
+        return poller.get_value(self.ip)
+    
+    def describe(self):
+        return self.ip
+    
+    def to_dict(self):
+        return {"name": self.name, "ip": self.ip, "interval": self.interval}
+
+class EmulatedESP(ESPDevice):
+    """Эмулятор ESP: опрашивается так же, как реальный, для смешанных и нагрузочных тестов"""
+    
+    backend = "emulator"
+    
+    def __init__(self, name, interval=None, fail_rate=0.1, change_rate=0.3, latency=0.0):
+        super().__init__(name, None, interval)
+        self.fail_rate = fail_rate  # доля запросов без ответа
+        self.change_rate = change_rate  # вероятность смены значения
+        self.latency = latency  # имитация времени ответа, сек
+        self.value = 0
+    
+    def read(self, poller):
+        if self.latency:
+            time.sleep(self.latency)
+        if random.random() < self.fail_rate:
+            return None
+        if self.value == 0 or random.random() < self.change_rate:
+            self.value = random.randint(1, 6)
+        return self.value
+    
+    def describe(self):
+        return "эмулятор"
+    
+    def to_dict(self):
+        return {"name": self.name, "emulated": True, "interval": self.interval,
+                "fail_rate": self.fail_rate, "latency": self.latency}
+
+def load_devices(path):
+    """
+    Загрузка реестра устройств из JSON
+    
+    Формат: {"devices": [{"name": "Куб 1", "ip": "192.168.137.176", "interval": 5},
+                         {"name": "Эмулятор", "emulated": true, "count": 20, "latency": 0.05}]}
+    Запись без "ip" или с "emulated": true - эмулятор; "count" размножает запись.
+    
+    Args:
+        path: путь к файлу
+    Returns:
+        список устройств
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    
+    devices = []
+    for item in data["devices"] if isinstance(data, dict) else data:
+        count = int(item.get("count", 1))
+        for n in range(count):
+            name = item.get("name", f"ESP #{len(devices) + 1}")
+            if count > 1:
+                name = f"{name} {n + 1}"
+            interval = item.get("interval")
+            if item.get("emulated") or "ip" not in item:
+                devices.append(EmulatedESP(name, interval,
+                                           fail_rate=item.get("fail_rate", 0.1),
+                                           latency=item.get("latency", 0.0)))
+            else:
+                devices.append(ESPDevice(name, item["ip"], interval))
+    if not devices:
+        raise ValueError("в реестре нет устройств")
+    return devices
+
+class ESPPoller:
+    """Параллельный опрос ESP через общую сессию с пулом соединений"""
+    
+    def __init__(self, timeout=2, max_workers=16):
+        self.timeout = timeout  # секунд на ответ одного ESP
+        
+        # Соединения переиспользуются (keep-alive), а не открываются на каждый запрос
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=0)
+        self.session.mount("http://", adapter)
+        
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="esp-poll")
+        self.last_cycle_time = 0.0  # длительность последнего опроса, сек
+        self.in_flight = {}  # {устройство: future} запросы, не завершившиеся к концу своего цикла
+        self.last_skipped = 0  # сколько устройств пропущено в последнем опросе
+    
+    def get_value(self, ip):
+        """Получение значения 1-6 с одного ESP (None - нет ответа или ошибка)"""
+        try:
+            response = self.session.get(f"http://{ip}/random", timeout=self.timeout)
+            if response.status_code == 200:
+                value = int(response.text.strip())
+                if 1 <= value <= 6:
+                    return value
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Ошибка подключения к ESP {ip}: {e}")
+        
+        return None
+    
+    def poll(self, devices):
+        """
+        Опрос всех устройств одновременно
+        
+        Устройство, чей прошлый запрос еще не завершился (ESP завис дольше
+        таймаута), не опрашивается повторно: иначе зависшие запросы
+        занимали бы все потоки пула и здоровые ESP ждали бы очереди.
+        
+        Args:
+            devices: словарь {номер квадрата: устройство (ESPDevice, EmulatedESP)}
+        Returns:
+            словарь {номер квадрата: значение или None}
+        """
+        started = time.perf_counter()
+        futures = {}
+        skipped = 0
+        for num, device in devices.items():
+            previous = self.in_flight.get(device)
+            if previous is not None and not previous.done():
+                skipped += 1
+                continue
+            futures[num] = self.executor.submit(device.read, self)
+        
+        # Цикл длится не дольше самого медленного ответа (и не дольше таймаута)
+        done, _ = wait(futures.values(), timeout=self.timeout + 0.5)
+        self.last_cycle_time = time.perf_counter() - started
+        self.last_skipped = skipped
+        
+        values = {num: None for num in devices}
+        for num, future in futures.items():
+            if future in done:
+                self.in_flight.pop(devices[num], None)
+                values[num] = future.result()
+            else:
+                self.in_flight[devices[num]] = future
+        return values
+    
+    def close(self):
+        """Остановка потоков и закрытие соединений"""
+        self.executor.shutdown(wait=False)
+        self.session.close()
+
 class ESPSquaresMonitor:
     def __init__(self, root):
         self.root = root
@@ -20,9 +178,19 @@ class ESPSquaresMonitor:
         # Конфигурация
         self.esp_ip = "192.168.137.176"  # IP вашего ESP
         self.update_interval = 5  # секунд
-        self.total_squares = 10
+        self.request_timeout = 2  # секунд на ответ одного ESP
+        self.devices_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "devices.json")
         self.is_monitoring = False
         
+        # Реестр устройств: из файла, иначе один реальный ESP и 9 эмуляторов.
+        # Устройства без своего "interval" опрашиваются с общим интервалом (поле "сек")
+        self.devices = self.load_registry()
+        self.total_squares = len(self.devices)
+        self.esp_ip = self.primary_ip() or self.esp_ip
+        
+        # Опрос всех устройств (реальных и эмуляторов)
+        self.poller = ESPPoller(timeout=self.request_timeout, max_workers=max(16, self.total_squares))
+        
         # Цветовая схема для значений 1-6
         self.color_map = {
             1: "#2ecc71",  # зеленый
@@ -37,15 +205,51 @@ class ESPSquaresMonitor:
         # Состояние квадратов
         self.squares_state = [0] * self.total_squares  # 0 = нет данных
         
-        # Для первого ESP (реальный)
-        self.esp_state = 0  # Текущее значение с ESP
-        
         # Статистика
         self.history = {i: [] for i in range(self.total_squares)}
         self.total_counts = Counter()
         
         self.setup_ui()
+    
+    def load_registry(self):
+        """Список устройств из devices.json (или по умолчанию, если файла нет)"""
+        if os.path.exists(self.devices_file):
+            try:
+                return load_devices(self.devices_file)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"Ошибка чтения {self.devices_file}: {e}")
         
+        self.devices_file = None
+        return [ESPDevice("ESP #1", self.esp_ip)] + [EmulatedESP(f"ESP #{i+1}") for i in range(1, 10)]
+    
+    def primary_ip(self):
+        """IP первого реального ESP (его можно поменять в поле ввода)"""
+        for device in self.devices:
+            if device.backend == "http":
+                return device.ip
+        return None
+    
+    def set_primary_ip(self, ip):
+        """Новый IP из поля ввода - первому реальному ESP"""
+        self.esp_ip = ip
+        for device in self.devices:
+            if device.backend == "http":
+                device.ip = ip
+                return
+    
+    def grid_layout(self):
+        """
+        Размер сетки под количество устройств
+        
+        Returns:
+            (колонок, размер квадрата в пикселях)
+        """
+        n = self.total_squares
+        # 10 устройств - прежняя сетка 2x5, больше - примерно вдвое шире, чем выше
+        columns = min(n, max(5, math.ceil(math.sqrt(n * 2))))
+        size = 100 if n <= 10 else max(40, int(100 * math.sqrt(10 / n)))
+        return columns, size
+    
     def setup_ui(self):
         # Главный контейнер
         main_frame = ttk.Frame(self.root)
@@ -87,45 +291,67 @@ class ESPSquaresMonitor:
                   command=self.show_settings).pack(side="left", padx=2)
         
         # Основная область - квадраты
-        squares_frame = ttk.LabelFrame(main_frame, text="ESP Squares (10 устройств)")
+        squares_frame = ttk.LabelFrame(main_frame, text=f"ESP Squares ({self.total_squares} устройств)")
         squares_frame.pack(fill="both", expand=True, pady=(0, 20))
         
-        # Сетка 2x5 для квадратов
-        grid_frame = ttk.Frame(squares_frame)
-        grid_frame.pack(expand=True, padx=20, pady=20)
+        columns, size = self.grid_layout()
+        small = size < 100
+        
+        if self.total_squares > 10:
+            # Много устройств - сетка в прокручиваемой области
+            scroll_canvas = tk.Canvas(squares_frame, highlightthickness=0)
+            scrollbar = ttk.Scrollbar(squares_frame, orient="vertical", command=scroll_canvas.yview)
+            scroll_canvas.configure(yscrollcommand=scrollbar.set)
+            scrollbar.pack(side="right", fill="y")
+            scroll_canvas.pack(side="left", fill="both", expand=True)
+            
+            grid_frame = ttk.Frame(scroll_canvas)
+            scroll_canvas.create_window((0, 0), window=grid_frame, anchor="nw")
+            grid_frame.bind("<Configure>", lambda e: scroll_canvas.configure(
+                scrollregion=scroll_canvas.bbox("all")))
+        else:
+            # Сетка 2x5 для квадратов
+            grid_frame = ttk.Frame(squares_frame)
+            grid_frame.pack(expand=True, padx=20, pady=20)
         
         self.square_canvases = []
         self.square_labels = []
         
-        for i in range(self.total_squares):
+        for i, device in enumerate(self.devices):
             # Фрейм для каждого квадрата
             square_frame = ttk.Frame(grid_frame, relief="ridge", borderwidth=2)
-            row = i // 5
-            col = i % 5
-            square_frame.grid(row=row, column=col, padx=10, pady=10, sticky="nsew")
+            row = i // columns
+            col = i % columns
+            pad = 4 if small else 10
+            square_frame.grid(row=row, column=col, padx=pad, pady=pad, sticky="nsew")
             
             # Заголовок квадрата
-            title = ttk.Label(square_frame, text=f"ESP #{i+1}", 
-                             font=("Arial", 12, "bold"))
+            title = ttk.Label(square_frame, text=device.name,
+                             font=("Arial", 9 if small else 12, "bold"))
             title.pack(pady=(5, 0))
             
             # Canvas для цветного квадрата
-            canvas = tk.Canvas(square_frame, width=100, height=100, 
+            canvas = tk.Canvas(square_frame, width=size, height=size,
                               bg=self.color_map[0], highlightthickness=0)
             canvas.pack(pady=5)
             
             # Рисуем квадрат
-            canvas.create_rectangle(10, 10, 90, 90, fill=self.color_map[0], 
-                                   outline="black", width=2)
+            margin = size // 10
+            canvas.create_rectangle(margin, margin, size - margin, size - margin,
+                                   fill=self.color_map[0], outline="black", width=2)
             
             # Метка с текущим значением
-            value_label = ttk.Label(square_frame, text="--", 
-                                   font=("Arial", 16, "bold"))
+            value_label = ttk.Label(square_frame, text="--",
+                                   font=("Arial", 11 if small else 16, "bold"))
             value_label.pack(pady=(0, 5))
             
+            # Адрес устройства или "эмулятор"
+            ttk.Label(square_frame, text=device.describe(),
+                     font=("Arial", 7 if small else 8), foreground="gray").pack()
+            
             # Статус подключения
-            status_label = ttk.Label(square_frame, text="❌ Нет данных", 
-                                    font=("Arial", 8), foreground="gray")
+            status_label = ttk.Label(square_frame, text="❌ Нет данных",
+                                    font=("Arial", 7 if small else 8), foreground="gray")
             status_label.pack(pady=(0, 5))
             
             self.square_canvases.append({
@@ -151,7 +377,7 @@ class ESPSquaresMonitor:
         for value, color in self.color_map.items():
             if value == 0:
                 continue  # Пропускаем серый цвет
-                
+            
             color_frame = ttk.Frame(colors_frame)
             color_frame.pack(side="left", padx=15)
             
@@ -203,49 +429,21 @@ class ESPSquaresMonitor:
                      bg=self.color_map[value]).pack(side="left")
             ttk.Label(legend_item, text=f"={value} ({color_names[value-1]})").pack(side="left")
         
-        # Для первого ESP (реальный) показываем его IP
-        esp_info = ttk.Label(main_frame, 
-                            text=f"ESP #1 подключается к: {self.esp_ip}",
+        # Откуда взят реестр и сколько в нем реальных устройств
+        real_count = sum(1 for d in self.devices if d.backend == "http")
+        registry = os.path.basename(self.devices_file) if self.devices_file else "по умолчанию"
+        esp_info = ttk.Label(main_frame,
+                            text=f"Реальных ESP: {real_count}, эмуляторов: {self.total_squares - real_count} "
+                                 f"(реестр: {registry})",
                             font=("Arial", 10, "italic"))
         esp_info.pack(pady=5)
         
-        # Эмуляция данных для остальных ESP
+        # Эмуляторы можно отключить - тогда они показываются без данных
         self.emulate_check = tk.BooleanVar(value=True)
-        emulate_checkbox = ttk.Checkbutton(main_frame, 
-                                          text="Эмулировать данные для ESP #2-10",
+        emulate_checkbox = ttk.Checkbutton(main_frame,
+                                          text="Опрашивать эмулируемые ESP",
                                           variable=self.emulate_check)
         emulate_checkbox.pack()
-        
-    def get_esp_data(self):
-        """Получение данных с реального ESP"""
-        try:
-            response = requests.get(f"http://{self.esp_ip}/random", timeout=2)
-            if response.status_code == 200:
-                value = int(response.text.strip())
-                if 1 <= value <= 6:
-                    return value
-        except requests.exceptions.RequestException as e:
-            print(f"Ошибка подключения к ESP: {e}")
-        
-        return None  # Если не удалось получить данные
-    
-    def emulate_esp_data(self, esp_num):
-        """Эмуляция данных для ESP (кроме первого)"""
-        if esp_num == 0:  # Первый ESP - реальный
-            return self.esp_state if self.esp_state != 0 else None
-        
-        # Для остальных ESP эмулируем данные
-        if self.emulate_check.get():
-            # Эмуляция: иногда возвращаем случайное значение, иногда ошибку
-            if random.random() > 0.1:  # 90% успешных запросов
-                # С небольшим шансом меняем значение
-                if random.random() > 0.7:
-                    return random.randint(1, 6)
-                else:
-                    # Сохраняем предыдущее значение или новое
-                    current = self.squares_state[esp_num]
-                    return current if current != 0 else random.randint(1, 6)
-        return None
     
     def update_square(self, esp_num, value):
         """Обновление отображения квадрата"""
@@ -293,29 +491,51 @@ class ESPSquaresMonitor:
         # Обновляем общий счетчик
         self.total_counts.update(self.squares_state)
     
-    def update_all_squares(self):
-        """Обновление всех квадратов"""
-        # Обновляем реальный ESP
-        esp_value = self.get_esp_data()
-        self.esp_state = esp_value if esp_value else 0
-        self.update_square(0, esp_value)
-        
-        # Обновляем остальные ESP (эмулированные)
-        for i in range(1, self.total_squares):
-            value = self.emulate_esp_data(i)
-            self.update_square(i, value)
+    def device_interval(self, device):
+        """Интервал опроса устройства: свой из реестра или общий"""
+        return device.interval or self.update_interval
+    
+    def next_poll_delay(self):
+        """Сколько секунд до опроса ближайшего устройства"""
+        now = time.monotonic()
+        return max(0.0, min(d.last_poll + self.device_interval(d) - now for d in self.devices))
+    
+    def update_all_squares(self, force=False):
+        """
+        Обновление квадратов, у которых подошло время опроса
+        
+        Args:
+            force: опросить все устройства сразу
+        """
+        now = time.monotonic()
+        due = {num: device for num, device in enumerate(self.devices)
+               if force or now - device.last_poll >= self.device_interval(device)}
+        if not due:
+            return
+        for device in due.values():
+            device.last_poll = now
+        
+        # Реальные ESP и эмуляторы опрашиваются параллельно одним пулом
+        emulate = self.emulate_check.get()
+        values = self.poller.poll({num: device for num, device in due.items()
+                                   if emulate or device.backend != "emulator"})
+        for num in due:
+            self.update_square(num, values.get(num))
         
         # Обновляем статистику
         self.update_statistics()
         
         # Обновляем статус
         success_count = sum(1 for v in self.squares_state if v != 0)
-        self.status_var.set(f"✅ Обновлено: {success_count}/{self.total_squares} | Следующее обновление через {self.update_interval} сек")
+        self.status_var.set(f"✅ Обновлено: {success_count}/{self.total_squares} | "
+                            f"Опрошено: {len(due)} за {self.poller.last_cycle_time:.2f} сек | "
+                            f"Ждут ответа: {self.poller.last_skipped} | "
+                            f"Следующее обновление через {self.next_poll_delay():.0f} сек")
     
     def manual_update(self):
         """Ручное обновление"""
         if not self.is_monitoring:
-            self.update_all_squares()
+            self.update_all_squares(force=True)
     
     def monitoring_loop(self):
         """Цикл мониторинга"""
@@ -325,8 +545,8 @@ class ESPSquaresMonitor:
             except Exception as e:
                 self.status_var.set(f"❌ Ошибка: {str(e)[:50]}")
             
-            # Ждем указанный интервал
-            for i in range(self.update_interval * 10):  # Проверяем каждые 0.1 сек
+            # Ждем ближайшего опроса
+            for i in range(max(1, int(self.next_poll_delay() * 10))):  # Проверяем каждые 0.1 сек
                 if not self.is_monitoring:
                     return
                 time.sleep(0.1)
@@ -340,7 +560,7 @@ class ESPSquaresMonitor:
             
             # Обновляем конфигурацию
             try:
-                self.esp_ip = self.ip_var.get()
+                self.set_primary_ip(self.ip_var.get())
                 self.update_interval = int(self.interval_var.get())
             except:
                 messagebox.showerror("Ошибка", "Некорректные настройки")
@@ -398,7 +618,7 @@ class ESPSquaresMonitor:
                 3: "Синий", 4: "Желтый", 5: "Оранжевый", 6: "Белый"
             }.get(value, "Неизвестно")
             
-            stats_lines.append(f"  ESP #{i+1}: значение={value} ({color_name})")
+            stats_lines.append(f"  {self.devices[i].name}: значение={value} ({color_name})")
         
         stats_lines.append("")
         
@@ -428,7 +648,7 @@ class ESPSquaresMonitor:
         
         for time_str, esp_num, value in all_events[:20]:
             color_name = ["Зеленый", "Красный", "Синий", "Желтый", "Оранжевый", "Белый"][value-1]
-            stats_lines.append(f"  [{time_str}] ESP #{esp_num+1} → {value} ({color_name})")
+            stats_lines.append(f"  [{time_str}] {self.devices[esp_num].name} → {value} ({color_name})")
         
         # Вставляем текст
         stats_text.insert("1.0", "\n".join(stats_lines))
@@ -518,7 +738,7 @@ class ESPSquaresMonitor:
         emul_frame.pack(fill="x", padx=20, pady=10)
         
         emulate_var = tk.BooleanVar(value=self.emulate_check.get())
-        emulate_check = ttk.Checkbutton(emul_frame, text="Эмулировать данные для ESP #2-10",
+        emulate_check = ttk.Checkbutton(emul_frame, text="Опрашивать эмулируемые ESP",
                                        variable=emulate_var)
         emulate_check.grid(row=0, column=0, columnspan=2, padx=5, pady=5, sticky="w")
         
@@ -527,7 +747,7 @@ class ESPSquaresMonitor:
         btn_frame.pack(pady=20)
         
         def save_settings():
-            self.esp_ip = ip_entry.get()
+            self.set_primary_ip(ip_entry.get())
             try:
                 self.update_interval = int(interval_entry.get())
             except:
@@ -551,6 +771,7 @@ class ESPSquaresMonitor:
                 "export_time": datetime.now().isoformat(),
                 "esp_ip": self.esp_ip,
                 "total_squares": self.total_squares,
+                "devices": [device.to_dict() for device in self.devices],
                 "current_state": self.squares_state,
                 "history": self.history,
                 "total_counts": dict(self.total_counts)
@@ -569,6 +790,8 @@ def main():
     
     # Запускаем цикл обработки событий
     root.mainloop()
+    app.is_monitoring = False
+    app.poller.close()
 
 if __name__ == "__main__":
     main()